@@ -0,0 +1,153 @@
+"""
+Admission control in front of `on_submit`.
+
+At most `max_in_flight` requests run at once, and at most `max_queue_depth` more wait for a slot in FIFO order.
+A request is rejected straight away when the queue is full or when its estimated wait, based on a moving
+average of how long requests take, is longer than anyone would wait for an answer. Requests admitted while
+others are queued run in a degraded mode that skips the step animation and, under heavier load, the summary
+model, so the backlog drains faster.
+"""
+from typing import Any, AsyncIterator, Dict, List
+
+from contextlib import asynccontextmanager
+
+from dataclasses import dataclass
+
+import asyncio
+
+import time
+
+
+class AdmissionRejectedError(Exception):
+    def __init__(self, reason: str, estimated_wait_s: float) -> None:
+        super().__init__(f"{reason}, estimated wait of {estimated_wait_s:.1f}s")
+        self.estimated_wait_s = estimated_wait_s
+
+
+@dataclass
+class Admission:
+    wait_s: float
+    skip_animation: bool
+    skip_summary: bool
+
+    @property
+    def degraded(self) -> bool:
+        return self.skip_animation or self.skip_summary
+
+
+class AdmissionController:
+    # Weight of the latest request in the moving average of request durations
+    DURATION_SMOOTHING = 0.2
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue_depth: int,
+        max_estimated_wait_s: float,
+        initial_duration_s: float = 10.0,
+        skip_animation_queue_depth: int = 1,
+        skip_summary_queue_depth: int | None = None,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_queue_depth = max_queue_depth
+        self.max_estimated_wait_s = max_estimated_wait_s
+        self.skip_animation_queue_depth = skip_animation_queue_depth
+        self.skip_summary_queue_depth = (
+            skip_summary_queue_depth
+            if skip_summary_queue_depth is not None
+            else max(max_queue_depth // 2, 1)
+        )
+
+        self.in_flight = 0
+        self.mean_duration_s = initial_duration_s
+        self._waiters: List[asyncio.Future] = []
+
+        self.admitted = 0
+        self.rejected = 0
+        self.degraded = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def estimate_wait_s(self) -> float:
+        """
+        Estimated wait for a request arriving now, assuming the slots free up evenly.
+        """
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            return 0.0
+        return (self.queue_depth + 1) * self.mean_duration_s / self.max_in_flight
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[Admission]:
+        """
+        Waits for a slot and holds it for the duration of the block. Raises `AdmissionRejectedError` without
+        waiting if the request would not be served in time.
+        """
+        admission = await self._acquire()
+        start = time.monotonic()
+        try:
+            yield admission
+        finally:
+            duration_s = time.monotonic() - start
+            self.mean_duration_s += self.DURATION_SMOOTHING * (
+                duration_s - self.mean_duration_s
+            )
+            self._release()
+
+    async def _acquire(self) -> Admission:
+        enqueued_at = time.monotonic()
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+        else:
+            estimated_wait_s = self.estimate_wait_s()
+            if self.queue_depth >= self.max_queue_depth:
+                self.rejected += 1
+                raise AdmissionRejectedError("Queue is full", estimated_wait_s)
+            if estimated_wait_s > self.max_estimated_wait_s:
+                self.rejected += 1
+                raise AdmissionRejectedError("Too busy", estimated_wait_s)
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                # The slot is handed over by `_release`, `in_flight` already counts it
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif not waiter.cancelled():
+                    # Cancelled after the slot was handed over, pass it on
+                    self._release()
+                raise
+
+        self.admitted += 1
+        # Degrade based on how many requests are still waiting behind this one
+        admission = Admission(
+            wait_s=time.monotonic() - enqueued_at,
+            skip_animation=self.queue_depth >= self.skip_animation_queue_depth,
+            skip_summary=self.queue_depth >= self.skip_summary_queue_depth,
+        )
+        self.degraded += admission.degraded
+        return admission
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.pop(0)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_in_flight": self.max_in_flight,
+            "max_queue_depth": self.max_queue_depth,
+            "estimated_wait_s": round(self.estimate_wait_s(), 2),
+            "mean_duration_s": round(self.mean_duration_s, 2),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "degraded": self.degraded,
+        }
@@ -1,17 +1,17 @@
-from typing import Any, Callable, List, Tuple
-
-import huggingface_hub
+from typing import Any, Callable, Dict, List, Tuple
 
 from dataclasses import dataclass
 
 from datetime import datetime
 
-from time import sleep
-
-import inspect
+import asyncio
 
 import ast
 
+import logging
+
+import re
+
 from random import randint
 
 from urllib.parse import quote
@@ -20,12 +20,24 @@ from black import Mode, format_str
 
 import gradio as gr
 
-from huggingface_hub import InferenceClient
-
 from pymongo import MongoClient
 
+try:
+    from huggingface_hub.errors import ValidationError
+except ImportError:
+    # Older huggingface_hub releases define it next to the text generation types
+    from huggingface_hub.inference._text_generation import ValidationError
+
 from constants import *
+from admission import Admission, AdmissionController, AdmissionRejectedError
 from config import DemoConfig
+from inference_pool import InferenceClientPool
+from memory_profiling import MemoryProfiler
+from places_scheduler import PlacesRequestShedError
+from prompt_builder import PromptBuilder, RavenPrompt
+from request_logging import RequestLogger, get_logger, log_event, setup_logging
+from resilience import EndpointUnavailableError
+from streaming import StreamingTextBuffer, merge_updates
 from tools import Tools
 
 
@@ -94,35 +106,67 @@ FUNCTIONS = [
 
 
 class FunctionsHelper:
-    FUNCTION_DEFINITION_TEMPLATE = '''Function:
-def {name}{signature}:
-"""
-{docstring}
-"""
-
-'''
-    PROMPT_TEMPLATE = """{function_definitions}User Query: {query}<human_end>Call:"""
+    # Arguments the tools resolve with get_latitude_longitude, so they are worth resolving early
+    PREFETCHABLE_ARGUMENTS = {
+        "get_latitude_longitude": ["location"],
+        "find_places_near_location": ["location"],
+        "get_distance": ["place_1", "place_2"],
+    }
+    CALL_TOKEN_PATTERN = re.compile(
+        r"""(?P<call>\w+)\s*\(|(?P<keyword>\w+)\s*=|(?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")|(?P<close>\))"""
+    )
 
-    def __init__(self, tools: Tools) -> None:
+    def __init__(
+        self,
+        tools: Tools,
+        prompt_mode: str = "full",
+        profiler: MemoryProfiler | None = None,
+    ) -> None:
         self.tools = tools
+        self.profiler = profiler or MemoryProfiler()
+        self.functions_by_name = {f.name: f for f in FUNCTIONS}
+        self.prompt_builder = PromptBuilder(
+            type(tools), [f.name for f in FUNCTIONS], prompt_mode
+        )
 
-        function_definitions = ""
-        for function in FUNCTIONS:
-            f = getattr(tools, function.name)
-            signature = inspect.signature(f)
-            docstring = inspect.getdoc(f)
+    def get_prompt(self, query: str):
+        return self.build_prompt(query).prompt
 
-            function_str = self.FUNCTION_DEFINITION_TEMPLATE.format(
-                name=function.name, signature=signature, docstring=docstring
-            )
-            function_definitions += function_str
+    def build_prompt(self, query: str) -> RavenPrompt:
+        return self.prompt_builder.build(query)
 
-        self.prompt_without_query = self.PROMPT_TEMPLATE.format(
-            function_definitions=function_definitions, query="{query}"
-        )
+    def get_prefetchable_locations(self, partial_function_call_str: str) -> List[str]:
+        """
+        Returns the locations that the function call will look up, as far as they can be read from the possibly
+        incomplete `partial_function_call_str` while it is still being generated.
+        """
+        locations = []
+        frames = []
+        for match in self.CALL_TOKEN_PATTERN.finditer(partial_function_call_str):
+            if match["call"]:
+                frames.append({"name": match["call"], "keyword": None, "args": {}})
+            elif match["keyword"] and frames:
+                frames[-1]["keyword"] = match["keyword"]
+            elif match["string"] and frames and frames[-1]["keyword"]:
+                try:
+                    value = ast.literal_eval(match["string"])
+                except (SyntaxError, ValueError):
+                    continue
+                name, keyword = frames[-1]["name"], frames[-1]["keyword"]
+                frames[-1]["args"].setdefault(keyword, []).append(value)
+                if keyword in self.PREFETCHABLE_ARGUMENTS.get(name, []):
+                    locations.append(value)
+            elif match["close"] and frames:
+                frame = frames.pop()
+                if frame["name"] == "get_some_reviews":
+                    # Mirrors how get_some_reviews qualifies each place with the location
+                    location = frame["args"].get("location", [None])[0]
+                    for place_name in frame["args"].get("place_names", []):
+                        locations.append(
+                            f"{place_name} , {location}" if location else place_name
+                        )
 
-    def get_prompt(self, query: str):
-        return self.prompt_without_query.format(query=query)
+        return locations
 
     def get_function_call_plan(self, function_call_str: str) -> List[str]:
         function_call_list = []
@@ -137,29 +181,62 @@ def {name}{signature}:
         [eval(call, locals_to_pass) for call in calls]
         return function_call_list
 
-    def run_function_call(self, function_call_str: str):
-        function_call_list = []
-        locals_to_pass = {"function_call_list": function_call_list, "tools": self.tools}
-        for f in FUNCTIONS:
-            name = f.name
-
-            locals_to_pass[f"{name}_description_function"] = f.description_function
-            locals_to_pass[f"{name}_explanation_function"] = f.explanation_function
-
-            function_definition = f"""
-def {name}(**kwargs):
-    result = tools.{f.name}(**kwargs)
-    function_call_list.append(({name}_description_function(**kwargs), {name}_explanation_function(result)))
-    return result
-"""
-            exec(function_definition, locals_to_pass)
-
+    async def arun_function_call(
+        self, function_call_str: str, tools: Tools | None = None
+    ):
+        """
+        Runs the function calls in `function_call_str` one at a time, yielding each result along with the steps it
+        took. The calls are evaluated from their AST rather than with `eval` so that every tool call can be
+        awaited, including calls nested inside the arguments of another call.
+        """
+        tools = tools or self.tools
         calls = [c.strip() for c in function_call_str.split(";") if c.strip()]
         for call in calls:
-            locals_to_pass["function_call_list"] = function_call_list = []
-            result = eval(call, locals_to_pass)
+            function_call_list = []
+            expr = ast.parse(call, mode="eval").body
+            result = await self._aevaluate(expr, tools, function_call_list)
             yield result, function_call_list
 
+    async def _aevaluate(
+        self, node: ast.AST, tools: Tools, function_call_list: List
+    ) -> Any:
+        if isinstance(node, ast.Call):
+            f = self.functions_by_name[node.func.id]
+            args = [
+                await self._aevaluate(arg, tools, function_call_list)
+                for arg in node.args
+            ]
+            kwargs = {
+                keyword.arg: await self._aevaluate(
+                    keyword.value, tools, function_call_list
+                )
+                for keyword in node.keywords
+            }
+            result = await getattr(tools, f"a{f.name}")(*args, **kwargs)
+            self.profiler.record_payload(f"tool:{f.name}", result)
+            function_call_list.append(
+                (
+                    f.description_function(*args, **kwargs),
+                    f.explanation_function(result),
+                )
+            )
+            return result
+        if isinstance(node, (ast.List, ast.Tuple)):
+            values = [
+                await self._aevaluate(elt, tools, function_call_list)
+                for elt in node.elts
+            ]
+            return values if isinstance(node, ast.List) else tuple(values)
+        if isinstance(node, ast.Dict):
+            return {
+                await self._aevaluate(
+                    key, tools, function_call_list
+                ): await self._aevaluate(value, tools, function_call_list)
+                for key, value in zip(node.keys, node.values)
+            }
+
+        return ast.literal_eval(node)
+
 
 class RavenDemo(gr.Blocks):
     def __init__(self, config: DemoConfig) -> None:
@@ -170,17 +247,27 @@ class RavenDemo(gr.Blocks):
         super().__init__(theme=theme, css=CSS, title="NexusRaven V2 Demo")
 
         self.config = config
+        setup_logging()
+        self.logger = get_logger("app")
+        # Not read from `self.config`, gr.Blocks replaces it with its own config
+        self.log_payload_sample_rate = config.log_payload_sample_rate
         self.tools = Tools(config)
-        self.functions_helper = FunctionsHelper(self.tools)
+        self.profiler = MemoryProfiler(config.memory_profiling)
+        self.functions_helper = FunctionsHelper(
+            self.tools, config.raven_prompt_mode, self.profiler
+        )
         mongo_client = MongoClient(host=config.mongo_endpoint)
         self.collection = mongo_client[config.mongo_collection]["logs"]
 
-        self.raven_client = InferenceClient(
-            model=config.raven_endpoint, token=config.hf_token
+        self.raven_client = InferenceClientPool(
+            config.raven_endpoints, token=config.hf_token
         )
-        self.summary_model_client = InferenceClient(config.summary_model_endpoint)
+        self.summary_model_client = InferenceClientPool(config.summary_model_endpoints)
 
         self.max_num_steps = 20
+        self.admission_controller = AdmissionController(
+            max_in_flight=20, max_queue_depth=40, max_estimated_wait_s=30.0
+        )
         self.function_call_name_set = set([f.name for f in FUNCTIONS])
 
         with self:
@@ -250,9 +337,13 @@ class RavenDemo(gr.Blocks):
                     interactive=False,
                     show_copy_button=True,
                 )
-                gr.Textbox(
+                # Outside of "full" mode the functions in the prompt depend on the query
+                raven_prompt = gr.Textbox(
                     label="Raven prompt",
-                    value=self.functions_helper.get_prompt("{query}"),
+                    value=self.functions_helper.get_prompt("{query}")
+                    if config.raven_prompt_mode == "full"
+                    else "",
+                    placeholder="Submit a query to see the prompt sent to Raven",
                     interactive=False,
                     show_copy_button=True,
                     lines=20,
@@ -273,13 +364,21 @@ class RavenDemo(gr.Blocks):
                     *steps,
                     has_error,
                 ],
-                concurrency_limit=20,  # not a hyperparameter
+                # Bounded by the admission controller instead, so busy requests are rejected right away
+                concurrency_limit=None,
                 api_name=False,
             ).then(
                 self.check_for_error,
                 inputs=has_error,
                 outputs=[],
             )
+            user_input.submit(
+                fn=self.get_raven_prompt,
+                inputs=[user_input],
+                outputs=raven_prompt,
+                queue=False,
+                api_name=False,
+            )
 
             for i, button in enumerate(examples):
                 button.click(
@@ -295,12 +394,36 @@ class RavenDemo(gr.Blocks):
                 outputs=gmaps_html,
             )
 
-    def on_submit(self, query: str, request: gr.Request):
+            metrics = gr.JSON(visible=False)
+            gr.Button(visible=False).click(
+                fn=self.get_metrics,
+                inputs=[],
+                outputs=metrics,
+                api_name="metrics",
+            )
+
+    def get_raven_prompt(self, query: str) -> str:
+        return self.functions_helper.get_prompt(self._escape_query(query))
+
+    def _escape_query(self, query: str) -> str:
+        return query.replace("'", r"\'").replace('"', r"\"")
+
+    async def on_submit(self, query: str, request: gr.Request):
+        try:
+            async with self.admission_controller.admit() as admission:
+                async for outputs in self._on_submit(query, request, admission):
+                    yield outputs
+        except AdmissionRejectedError as e:
+            log_event(self.logger, "request_rejected", logging.WARNING, reason=str(e))
+            raise gr.Error(BUSY_MESSAGE)
+
+    async def _on_submit(self, query: str, request: gr.Request, admission: Admission):
         def get_returns():
             return (
                 user_input,
                 raven_function_call,
-                summary_model_summary,
+                # Only joined here, when an update is actually sent
+                summary_buffer.text,
                 relevant_places,
                 places_dropdown,
                 gmaps_html,
@@ -316,7 +439,7 @@ class RavenDemo(gr.Blocks):
 
         user_input = gr.Textbox(interactive=False)
         raven_function_call = ""
-        summary_model_summary = ""
+        summary_buffer = StreamingTextBuffer()
         relevant_places = []
         places_dropdown = ""
         gmaps_html = ""
@@ -326,21 +449,65 @@ class RavenDemo(gr.Blocks):
         initial_return = list(get_returns())
         yield initial_return
 
-        raven_prompt = self.functions_helper.get_prompt(
-            query.replace("'", r"\'").replace('"', r"\"")
-        )
-        print(f"{'-' * 80}\nPrompt sent to Raven\n\n{raven_prompt}\n\n{'-' * 80}\n")
-        stream = self.raven_client.text_generation(
-            raven_prompt, **RAVEN_GENERATION_KWARGS
+        log = RequestLogger(self.logger, self.log_payload_sample_rate)
+        log.event(
+            "request_received",
+            query=query,
+            admission_wait_s=round(admission.wait_s, 3),
+            skip_animation=admission.skip_animation,
+            skip_summary=admission.skip_summary,
         )
-        for s in stream:
-            for c in s:
-                raven_function_call += c
-                raven_function_call = raven_function_call.removesuffix("<bot_end>")
-                yield get_returns()
+
+        # Resolve the client while Raven is generating, the tools need their location first
+        tools = self.tools.for_request(self._get_client_ip(request))
+        tools.prefetch_current_location()
+
+        with self.profiler.stage("raven"):
+            raven_prompt = await asyncio.to_thread(
+                self.functions_helper.build_prompt, self._escape_query(query)
+            )
+            log.payload(
+                "raven_prompt_built",
+                "prompt",
+                raven_prompt.prompt,
+                prefix_tokens=raven_prompt.prefix_tokens,
+                function_names=raven_prompt.function_names,
+            )
+            raven_prompt = raven_prompt.prompt
+            stream = self.tools.resilience.stream(
+                "raven",
+                lambda: self.raven_client.text_generation(
+                    raven_prompt, **RAVEN_GENERATION_KWARGS
+                ),
+            )
+            raven_buffer = StreamingTextBuffer(
+                RAVEN_GENERATION_KWARGS["stop_sequences"]
+            )
+            prefetched_locations = set()
+            try:
+                async for s in stream:
+                    raven_buffer.append(s)
+                    raven_function_call = raven_buffer.text
+                    yield get_returns()
+
+                    # A new location can only be complete once a string or call has been closed
+                    if not any(c in s for c in "'\")"):
+                        continue
+                    for location in self.functions_helper.get_prefetchable_locations(
+                        raven_function_call
+                    ):
+                        if location not in prefetched_locations:
+                            prefetched_locations.add(location)
+                            tools.prefetch_latitude_longitude(location)
+            except EndpointUnavailableError as e:
+                log.event("raven_unavailable", logging.WARNING, error=str(e))
+                yield on_error()
+                return
+            raven_buffer.finish()
+            raven_function_call = raven_buffer.text
 
         raw_raven_response = raven_function_call
-        print(f"Raw Raven response before formatting: {raw_raven_response}")
+        log.payload("raven_response", "response", raw_raven_response)
 
         r_calls = [c.strip() for c in raven_function_call.split(";") if c.strip()]
         f_r_calls = []
@@ -348,10 +515,12 @@ class RavenDemo(gr.Blocks):
             try:
                 f_r_call = format_str(r_c.strip(), mode=Mode())
             except:
+                log.event("invalid_function_call", logging.WARNING, call=r_c)
                 yield on_error()
                 return
 
             if not self.whitelist_function_names(f_r_call):
+                log.event("function_not_allowed", logging.WARNING, call=f_r_call)
                 yield on_error()
                 return
 
@@ -361,95 +530,196 @@ class RavenDemo(gr.Blocks):
 
         yield get_returns()
 
-        self._set_client_ip(request)
         function_call_plan = self.functions_helper.get_function_call_plan(
             raven_function_call
         )
-        for i, v in enumerate(function_call_plan):
-            steps[i] = gr.Textbox(value=f"{i+1}. {v}", visible=True)
-            yield get_returns()
-            sleep(0.1)
 
-        results_gen = self.functions_helper.run_function_call(raven_function_call)
+        # The tools run while the plan is displayed, and each step is animated as soon as its call finishes
         results = []
-        previous_num_calls = 0
-        for result, function_call_list in results_gen:
-            results.extend(result)
-            for i, (description, explanation) in enumerate(function_call_list):
-                i = i + previous_num_calls
-
-                if len(description) > 100:
-                    description = function_call_plan[i]
-                to_stream = f"{i+1}. {description} ..."
-                steps[i] = ""
-                for c in to_stream:
-                    steps[i] += c
-                    sleep(0.005)
-                    yield get_returns()
+        function_call_lists = asyncio.Queue()
 
-                to_stream = "." * randint(0, 5)
-                for c in to_stream:
-                    steps[i] += c
-                    sleep(0.2)
-                    yield get_returns()
-
-                to_stream = f" {explanation}"
-                for c in to_stream:
-                    steps[i] += c
-                    sleep(0.005)
-                    yield get_returns()
+        async def run_function_calls():
+            try:
+                with self.profiler.stage("function_calls"):
+                    async for result, function_call_list in (
+                        self.functions_helper.arun_function_call(
+                            raven_function_call, tools
+                        )
+                    ):
+                        results.extend(result)
+                        function_call_lists.put_nowait(function_call_list)
+                self.profiler.record_payload("results", results)
+                log.event("function_calls_finished", num_results=len(results))
+            finally:
+                function_call_lists.put_nowait(None)
+
+        async def animate_steps():
+            nonlocal steps_accordion
+            previous_num_calls = 0
+            while (function_call_list := await function_call_lists.get()) is not None:
+                for i, (description, explanation) in enumerate(function_call_list):
+                    i = i + previous_num_calls
+
+                    if len(description) > 100:
+                        description = function_call_plan[i]
+                    if admission.skip_animation:
+                        steps[i] = f"{i+1}. {description} ... {explanation}"
+                        yield
+                        continue
+
+                    to_stream = f"{i+1}. {description} ..."
+                    steps[i] = ""
+                    for c in to_stream:
+                        steps[i] += c
+                        await asyncio.sleep(0.005)
+                        yield
+
+                    to_stream = "." * randint(0, 5)
+                    for c in to_stream:
+                        steps[i] += c
+                        await asyncio.sleep(0.2)
+                        yield
+
+                    to_stream = f" {explanation}"
+                    for c in to_stream:
+                        steps[i] += c
+                        await asyncio.sleep(0.005)
+                        yield
+
+                previous_num_calls += len(function_call_list)
+
+            steps_accordion = gr.Accordion(open=False)
+            yield
+
+        async def show_relevant_places():
+            nonlocal relevant_places, gmaps_html, places_dropdown
+            await function_calls_task
+            current_location = await current_location_task
+            relevant_places = self.get_relevant_places(results, current_location)
+            # Kept per session in `gr.State`
+            self.profiler.record_payload("relevant_places", relevant_places)
+            gmaps_html = self.get_gmaps_html(relevant_places[0])
+            places_dropdown_choices = self.get_place_dropdown_choices(relevant_places)
+            places_dropdown = gr.Dropdown(
+                choices=places_dropdown_choices, value=places_dropdown_choices[0]
+            )
+            yield
 
-            previous_num_calls += len(function_call_list)
+        summary_unavailable = False
 
-        relevant_places = self.get_relevant_places(results)
-        gmaps_html = self.get_gmaps_html(relevant_places[0])
-        places_dropdown_choices = self.get_place_dropdown_choices(relevant_places)
-        places_dropdown = gr.Dropdown(
-            choices=places_dropdown_choices, value=places_dropdown_choices[0]
-        )
-        steps_accordion = gr.Accordion(open=False)
-        yield get_returns()
+        async def stream_summary():
+            # Starts as soon as the results are final, rather than after the steps are animated
+            nonlocal summary_buffer, summary_unavailable
+            if admission.skip_summary:
+                # Under heavy load the summary model is the first thing to go
+                summary_buffer.append(SUMMARY_SKIPPED_MESSAGE)
+                yield
+                return
 
-        while True:
-            try:
-                summary_model_prompt = self.get_summary_model_prompt(results, query)
-                print(
-                    f"{'-' * 80}\nPrompt sent to summary model\n\n{summary_model_prompt}\n\n{'-' * 80}\n"
-                )
-                stream = self.summary_model_client.text_generation(
-                    summary_model_prompt, **SUMMARY_MODEL_GENERATION_KWARGS
-                )
-                for s in stream:
-                    s = s.removesuffix("<|end_of_turn|>")
-                    for c in s:
-                        summary_model_summary += c
-                        summary_model_summary = (
-                            summary_model_summary.lstrip().removesuffix(
-                                "<|end_of_turn|>"
-                            )
+            await function_calls_task
+            current_location = await current_location_task
+            summary_results = results
+            with self.profiler.stage("summary"):
+                while True:
+                    try:
+                        summary_model_prompt = self.get_summary_model_prompt(
+                            summary_results, query, current_location
                         )
-                        yield get_returns()
-            except huggingface_hub.inference._text_generation.ValidationError:
-                if len(results) > 1:
-                    new_length = (3 * len(results)) // 4
-                    results = results[:new_length]
-                    continue
-                else:
+                        self.profiler.record_payload(
+                            "summary_prompt", summary_model_prompt
+                        )
+                        log.payload(
+                            "summary_prompt_built",
+                            "prompt",
+                            summary_model_prompt,
+                            num_results=len(summary_results),
+                        )
+                        stream = self.tools.resilience.stream(
+                            "summary",
+                            lambda: self.summary_model_client.text_generation(
+                                summary_model_prompt, **SUMMARY_MODEL_GENERATION_KWARGS
+                            ),
+                            self._is_summary_model_failure,
+                        )
+                        summary_buffer = StreamingTextBuffer(
+                            ["<|end_of_turn|>"], lstrip=True
+                        )
+                        async for s in stream:
+                            summary_buffer.append(s)
+                            yield
+                        summary_buffer.finish()
+                        log.event(
+                            "summary_finished", summary_chars=len(summary_buffer.text)
+                        )
+                    except ValidationError:
+                        if len(summary_results) > 1:
+                            new_length = (3 * len(summary_results)) // 4
+                            summary_results = summary_results[:new_length]
+                            continue
+                        else:
+                            break
+                    except EndpointUnavailableError as e:
+                        # The results are already shown, so keep them and only report the missing summary
+                        log.event("summary_unavailable", logging.WARNING, error=str(e))
+                        summary_unavailable = True
+
                     break
 
-            break
+        function_calls_task = asyncio.create_task(run_function_calls())
+        current_location_task = asyncio.create_task(tools.aget_current_location())
+        try:
+            for i, v in enumerate(function_call_plan):
+                steps[i] = gr.Textbox(value=f"{i+1}. {v}", visible=True)
+                yield get_returns()
+                if not admission.skip_animation:
+                    await asyncio.sleep(0.1)
 
-        self.collection.insert_one(
+            async for _ in merge_updates(
+                animate_steps(), show_relevant_places(), stream_summary()
+            ):
+                yield get_returns()
+        except (PlacesRequestShedError, EndpointUnavailableError) as e:
+            # The Places quota is saturated or the API is unhealthy, fail fast rather than waiting on it
+            log.event("places_unavailable", logging.WARNING, error=str(e))
+            yield on_error()
+            return
+        finally:
+            function_calls_task.cancel()
+            current_location_task.cancel()
+
+        await asyncio.to_thread(
+            self.collection.insert_one,
             {
                 "query": query,
                 "raven_output": raw_raven_response,
-                "summary_output": summary_model_summary,
-            }
+                "summary_output": summary_buffer.text,
+            },
         )
 
+        log.event("request_finished", has_error=summary_unavailable)
         user_input = gr.Textbox(interactive=True, autofocus=False)
+        has_error = summary_unavailable
         yield get_returns()
 
+    def get_metrics(self) -> Dict[str, Any]:
+        metrics = {
+            "places_scheduler": self.tools.places_scheduler.stats(),
+            "spatial_index": self.tools.spatial_index.stats(),
+            "resilience": self.tools.resilience.stats(),
+            "admission": self.admission_controller.stats(),
+            "raven_replicas": self.raven_client.stats(),
+            "summary_model_replicas": self.summary_model_client.stats(),
+        }
+        if self.tools.place_cache is not None:
+            metrics["place_cache"] = self.tools.place_cache.stats()
+        if self.profiler.enabled:
+            metrics["memory"] = self.profiler.stats()
+        return metrics
+
+    def _is_summary_model_failure(self, error: Exception) -> bool:
+        # Prompts that are too long are retried with fewer results, the endpoint itself is fine
+        return not isinstance(error, ValidationError)
+
     def check_for_error(self, has_error: bool) -> None:
         if has_error:
             raise gr.Error(ERROR_MESSAGE)
@@ -469,7 +739,9 @@ class RavenDemo(gr.Blocks):
 
         return True
 
-    def get_summary_model_prompt(self, results: List, query: str) -> None:
+    def get_summary_model_prompt(
+        self, results: List, query: str, current_location: str
+    ) -> None:
         # TODO check what outputs are returned and return them properly
         ALLOWED_KEYS = [
             "author_name",
@@ -510,7 +782,6 @@ class RavenDemo(gr.Blocks):
             results_str += f"Result {idx + 1}\n{item_str}\n"
 
         current_time = datetime.now().strftime("%b %d, %Y %H:%M:%S")
-        current_location = self.tools.get_current_location()
 
         prompt = SUMMARY_MODEL_PROMPT.format(
             current_location=current_location,
@@ -520,7 +791,9 @@ class RavenDemo(gr.Blocks):
         )
         return prompt
 
-    def get_relevant_places(self, results: List) -> List[Tuple[str, str]]:
+    def get_relevant_places(
+        self, results: List, current_location: str | None = None
+    ) -> List[Tuple[str, str]]:
         """
         Returns
         -------
@@ -543,7 +816,7 @@ class RavenDemo(gr.Blocks):
         relevant_places = list(relevant_places.keys())
 
         if not relevant_places:
-            current_location = self.tools.get_current_location()
+            current_location = current_location or self.tools.get_default_location()
             relevant_places.append((current_location, current_location))
 
         return relevant_places
@@ -565,7 +838,7 @@ class RavenDemo(gr.Blocks):
         relevant_place = [p for p in relevant_places if p[1] == place_name][0]
         return self.get_gmaps_html(relevant_place)
 
-    def _set_client_ip(self, request: gr.Request) -> None:
+    def _get_client_ip(self, request: gr.Request) -> str:
         client_ip = request.client.host
         if (
             "headers" in request.kwargs
@@ -577,7 +850,7 @@ class RavenDemo(gr.Blocks):
         if x_forwarded_for:
             client_ip = x_forwarded_for.split(",")[0].strip()
 
-        self.tools.client_ip = client_ip
+        return client_ip
 
 
 demo = RavenDemo(DemoConfig.load_from_env())
@@ -0,0 +1,72 @@
+"""
+Memory benchmark for the demo. Runs queries through `on_submit` one at a time with memory profiling enabled,
+so every stage is measured on its own, then prints the per-stage peaks and payload sizes and flags payloads over
+`--max-payload-kb`.
+
+Needs the same environment as `app.py`. Raven and the summary model can be the local fake servers from
+`fake_tgi_server.py`. Pass `--url` instead to print the report of an already running demo started with
+`MEMORY_PROFILING=1`.
+
+    python benchmark_memory.py [--repeat N] [--max-payload-kb KB] [--url URL]
+"""
+from typing import Any, Dict
+
+import argparse
+
+import asyncio
+
+import json
+
+import os
+
+from memory_profiling import format_report
+
+
+class BenchmarkRequest:
+    """
+    Stands in for the `gr.Request` that `on_submit` reads the client IP from.
+    """
+
+    def __init__(self, client_ip: str) -> None:
+        self.client = type("Client", (), {"host": client_ip})()
+        self.kwargs = dict()
+        self.headers = dict()
+
+
+async def run_queries(repeat: int) -> Dict[str, Any]:
+    os.environ["MEMORY_PROFILING"] = "1"
+    from app import demo
+    from constants import EXAMPLE_QUERIES
+
+    for i in range(repeat):
+        for query_name, query in EXAMPLE_QUERIES.items():
+            print(f"[{i + 1}/{repeat}] {query_name}")
+            async for _ in demo.on_submit(query, BenchmarkRequest("127.0.0.1")):
+                pass
+
+    return demo.get_metrics()["memory"]
+
+
+def fetch_stats(url: str) -> Dict[str, Any]:
+    from gradio_client import Client
+
+    metrics = Client(url).predict(api_name="/metrics")
+    if isinstance(metrics, str):
+        # Some gradio_client versions return JSON outputs as a file
+        with open(metrics) as f:
+            metrics = json.load(f)
+    return metrics.get("memory", {"enabled": False})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--max-payload-kb", type=float, default=64.0)
+    parser.add_argument("--url", default=None)
+    args = parser.parse_args()
+
+    if args.url:
+        stats = fetch_stats(args.url)
+    else:
+        stats = asyncio.run(run_queries(args.repeat))
+    print(format_report(stats, args.max_payload_kb))
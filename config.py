@@ -1,3 +1,5 @@
+from typing import List
+
 from dataclasses import dataclass
 
 from os import getenv
@@ -8,6 +10,7 @@ class DemoConfig:
     gmaps_client_key: str
     ip_api_key: str
 
+    # Both endpoints may be comma separated lists of replicas, see `inference_pool.py`
     raven_endpoint: str
     hf_token: str
 
@@ -16,6 +19,26 @@ class DemoConfig:
     mongo_endpoint: str
     mongo_collection: str
 
+    # Set to a file path to share resolved places across restarts and processes
+    place_cache_path: str | None = None
+    place_cache_max_bytes: int = 256 * 1024 * 1024
+    # Set to a file built with `gazetteer.py` to resolve plain city names locally
+    gazetteer_path: str | None = None
+    # One of "full", "selected" or "compact", see `prompt_builder.py`
+    raven_prompt_mode: str = "full"
+    # Fraction of requests whose full prompts are logged, the rest only log their sizes
+    log_payload_sample_rate: float = 0.01
+    # Records memory per request stage and payload sizes, see `memory_profiling.py`. Slows every request down
+    memory_profiling: bool = False
+
+    @property
+    def raven_endpoints(self) -> List[str]:
+        return _split_endpoints(self.raven_endpoint)
+
+    @property
+    def summary_model_endpoints(self) -> List[str]:
+        return _split_endpoints(self.summary_model_endpoint)
+
     @classmethod
     def load_from_env(cls) -> "DemoConfig":
         return DemoConfig(
@@ -26,4 +49,16 @@ class DemoConfig:
             summary_model_endpoint=getenv("SUMMARY_MODEL_ENDPOINT"),
             mongo_endpoint=getenv("MONGO_ENDPOINT"),
             mongo_collection=getenv("MONGO_COLLECTION"),
+            place_cache_path=getenv("PLACE_CACHE_PATH"),
+            place_cache_max_bytes=int(
+                getenv("PLACE_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+            ),
+            gazetteer_path=getenv("GAZETTEER_PATH"),
+            raven_prompt_mode=getenv("RAVEN_PROMPT_MODE", "full"),
+            log_payload_sample_rate=float(getenv("LOG_PAYLOAD_SAMPLE_RATE", 0.01)),
+            memory_profiling=getenv("MEMORY_PROFILING", "").lower() in ("1", "true"),
         )
+
+
+def _split_endpoints(endpoints: str) -> List[str]:
+    return [e.strip() for e in endpoints.split(",") if e.strip()]
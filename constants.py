@@ -73,3 +73,5 @@ GMAPS_EMBED_HTML_TEMPLATE = """
 """
 
 ERROR_MESSAGE = "Sorry, I wasn't able to fulfill your request! Please try again :)"
+BUSY_MESSAGE = "Sorry, the demo is very busy right now! Please try again in a minute :)"
+SUMMARY_SKIPPED_MESSAGE = "The demo is busy, so the summary was skipped for this request. The results are shown above and on the map."
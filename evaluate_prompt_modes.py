@@ -0,0 +1,135 @@
+"""
+Offline evaluation of the Raven prompt modes in `prompt_builder.py`.
+
+For every labeled query this reports the prefix token count of each mode and whether the selected functions
+still include every function a correct plan needs. Pass `--raven-endpoint` to also generate a plan with each
+mode and check it calls the same functions as the plan generated from the full prompt.
+
+    python evaluate_prompt_modes.py [--raven-endpoint URL]
+"""
+from typing import List, Set
+
+import argparse
+
+import ast
+
+from os import getenv
+
+from constants import EXAMPLE_QUERIES, RAVEN_GENERATION_KWARGS
+from prompt_builder import FUNCTION_KEYWORDS, PROMPT_MODES, PromptBuilder
+from tools import Tools
+
+
+# The functions a correct plan for each query needs
+LABELED_QUERIES = {
+    EXAMPLE_QUERIES["Discover Your Locale"]: {
+        "get_current_location",
+        "find_places_near_location",
+    },
+    EXAMPLE_QUERIES["Gather Opinions"]: {"get_some_reviews"},
+    EXAMPLE_QUERIES["Compare Feedback"]: {"get_some_reviews"},
+    EXAMPLE_QUERIES["Tailored Recommendations"]: {"find_places_near_location"},
+    EXAMPLE_QUERIES["Proximity Searches"]: {
+        "find_places_near_location",
+        "sort_results",
+    },
+    EXAMPLE_QUERIES["Deep Insights"]: {"get_some_reviews"},
+    "How far is the Golden Gate Bridge from the Ferry Building?": {"get_distance"},
+    "What are the closest coffee shops to me?": {
+        "get_current_location",
+        "find_places_near_location",
+        "sort_results",
+    },
+    "What are the best rated museums in Chicago?": {
+        "find_places_near_location",
+        "sort_results",
+    },
+    "Recommend some things to do in Austin": {
+        "get_recommendations",
+        "get_latitude_longitude",
+    },
+    "What are people saying about the cheapest sushi place near Stanford?": {
+        "find_places_near_location",
+        "sort_results",
+        "get_some_reviews",
+    },
+}
+
+
+def get_called_functions(function_call_str: str) -> List[str]:
+    function_call_str = function_call_str.split("<bot_end>")[0]
+    called_functions = []
+    for call in function_call_str.split(";"):
+        if not call.strip():
+            continue
+        try:
+            tree = ast.parse(call.strip())
+        except SyntaxError:
+            called_functions.append("<unparseable>")
+            continue
+        called_functions += [
+            node.func.id
+            for node in ast.walk(tree)
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+        ]
+    return sorted(called_functions)
+
+
+def main(raven_endpoint: str | None) -> None:
+    function_names = list(FUNCTION_KEYWORDS)
+    builders = {
+        mode: PromptBuilder(Tools, function_names, mode) for mode in PROMPT_MODES
+    }
+
+    raven_client = None
+    if raven_endpoint:
+        from huggingface_hub import InferenceClient
+
+        raven_client = InferenceClient(model=raven_endpoint, token=getenv("HF_TOKEN"))
+        generation_kwargs = {**RAVEN_GENERATION_KWARGS, "stream": False}
+
+    total_tokens = {mode: 0 for mode in PROMPT_MODES}
+    selection_misses = {mode: 0 for mode in PROMPT_MODES}
+    plan_matches = {mode: 0 for mode in PROMPT_MODES}
+    for query, required_functions in LABELED_QUERIES.items():
+        print(f"{'-' * 80}\n{query}")
+        full_plan = None
+        for mode, builder in builders.items():
+            raven_prompt = builder.build(query)
+            missing: Set[str] = required_functions - set(raven_prompt.function_names)
+            total_tokens[mode] += raven_prompt.prefix_tokens
+            selection_misses[mode] += bool(missing)
+
+            line = f"  {mode:>8}: {raven_prompt.prefix_tokens:>5} prefix tokens"
+            if missing:
+                line += f", MISSING {sorted(missing)}"
+
+            if raven_client is not None:
+                plan = get_called_functions(
+                    raven_client.text_generation(
+                        raven_prompt.prompt, **generation_kwargs
+                    )
+                )
+                full_plan = full_plan if full_plan is not None else plan
+                plan_matches[mode] += plan == full_plan
+                line += f", plan {plan}"
+
+            print(line)
+
+    num_queries = len(LABELED_QUERIES)
+    print(f"{'-' * 80}\nSummary over {num_queries} queries")
+    for mode in PROMPT_MODES:
+        line = (
+            f"  {mode:>8}: {total_tokens[mode] / num_queries:>7.1f} mean prefix tokens, "
+            f"{selection_misses[mode]} queries missing a required function"
+        )
+        if raven_client is not None:
+            line += f", {plan_matches[mode]}/{num_queries} plans match the full prompt"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--raven-endpoint", default=None)
+    args = parser.parse_args()
+    main(args.raven_endpoint)
@@ -0,0 +1,119 @@
+"""
+Fake text generation inference (TGI) servers for trying the inference client pool locally.
+
+Starts one server per port. Each streams a canned response token by token like TGI does, with configurable time
+to first token, time per token and failure rate, and answers `/health` unless it is failing. Raven prompts get a
+function call back and any other prompt gets a short summary.
+
+    python fake_tgi_server.py --ports 8081 8082 8083 --failure-rate 0.2
+    RAVEN_ENDPOINT=http://localhost:8081,http://localhost:8082 \\
+    SUMMARY_MODEL_ENDPOINT=http://localhost:8083 python app.py
+"""
+from typing import List
+
+import argparse
+
+import asyncio
+
+import json
+
+import random
+
+import re
+
+from aiohttp import web
+
+
+RAVEN_RESPONSE = "find_places_near_location(type_of_place='restaurant', location=get_current_location())<bot_end>"
+SUMMARY_RESPONSE = "Here are a few places that match your query, according to the search results.<|end_of_turn|>"
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"\s*\S+", text)
+
+
+class FakeTGIServer:
+    def __init__(
+        self,
+        first_token_delay_s: float,
+        token_delay_s: float,
+        failure_rate: float,
+    ) -> None:
+        self.first_token_delay_s = first_token_delay_s
+        self.token_delay_s = token_delay_s
+        self.failure_rate = failure_rate
+        # Set to make the server look down, /health included
+        self.down = False
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/health", self.health)
+        app.router.add_post("/", self.generate)
+        app.router.add_post("/generate", self.generate)
+        app.router.add_post("/generate_stream", self.generate)
+        return app
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.Response(status=503 if self.down else 200)
+
+    async def generate(self, request: web.Request) -> web.StreamResponse:
+        if self.down or random.random() < self.failure_rate:
+            return web.json_response(
+                {"error": "Model is overloaded", "error_type": "overloaded"},
+                status=503,
+            )
+
+        payload = await request.json()
+        prompt = payload.get("inputs", "")
+        response_text = RAVEN_RESPONSE if "<human_end>" in prompt else SUMMARY_RESPONSE
+        tokens = tokenize(response_text)
+
+        await asyncio.sleep(self.first_token_delay_s)
+        stream = payload.get("stream") or request.path == "/generate_stream"
+        if not stream:
+            return web.json_response([{"generated_text": response_text}])
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i, text in enumerate(tokens):
+            if i > 0:
+                await asyncio.sleep(self.token_delay_s)
+            is_last = i == len(tokens) - 1
+            event = {
+                "index": i,
+                "token": {"id": i, "text": text, "logprob": 0.0, "special": False},
+                "generated_text": response_text if is_last else None,
+                "details": None,
+            }
+            await response.write(f"data:{json.dumps(event)}\n\n".encode())
+        await response.write_eof()
+        return response
+
+
+async def serve(args: argparse.Namespace) -> None:
+    runners = []
+    for port in args.ports:
+        server = FakeTGIServer(
+            args.first_token_delay_s, args.token_delay_s, args.failure_rate
+        )
+        runner = web.AppRunner(server.make_app())
+        await runner.setup()
+        await web.TCPSite(runner, args.host, port).start()
+        runners.append(runner)
+        print(f"Fake TGI server listening on http://{args.host}:{port}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--ports", type=int, nargs="+", default=[8081])
+    parser.add_argument("--first-token-delay-s", type=float, default=0.2)
+    parser.add_argument("--token-delay-s", type=float, default=0.02)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    asyncio.run(serve(parser.parse_args()))
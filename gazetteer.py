@@ -0,0 +1,227 @@
+"""
+An optional offline gazetteer that resolves plain city names, optionally qualified by region or country, without
+calling Google.
+
+The gazetteer is a single prebuilt file that is memory-mapped read-only, so every worker process on the host
+shares the same pages. It is built from the GeoNames dumps (https://download.geonames.org/export/dump/):
+
+    python gazetteer.py cities15000.txt admin1CodesASCII.txt countryInfo.txt gazetteer.bin
+
+File layout, all integers little endian:
+    header:  magic (4 bytes), number of index entries (u32)
+    index:   one (key offset u32, key length u16, record offset u32, record length u16) entry per key,
+             sorted by key bytes so lookups are a binary search
+    keys:    normalized UTF-8 names such as "austin", "austin, tx" or "austin, texas, united states"
+    records: one tab separated "name, region, country, lat, lng, population" record per place
+"""
+from typing import Any, Dict, Iterable, List, Tuple
+
+from math import radians, cos, sin, asin, sqrt
+
+import mmap
+
+import struct
+
+import sys
+
+import unicodedata
+
+
+MAGIC = b"NXGZ"
+HEADER = struct.Struct("<4sI")
+INDEX_ENTRY = struct.Struct("<IHIH")
+
+# Extra ways people refer to countries that are not in countryInfo.txt
+COUNTRY_ALIASES = {"US": ["usa", "united states of america"]}
+
+
+def normalize_name(name: str) -> str:
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    name = name.lower().replace(".", "")
+    parts = [" ".join(part.split()) for part in name.split(",")]
+    return ", ".join(part for part in parts if part)
+
+
+class Gazetteer:
+    # How much more populous the top candidate must be for an ambiguous name to count as a clear match
+    AMBIGUITY_RATIO = 10
+    # Candidates within this distance of the user win, mirroring the Places location bias
+    BIAS_RADIUS_KM = 100 * 1.60934
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self._num_entries = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a gazetteer file")
+
+    def _entry(self, i: int) -> Tuple[int, int, int, int]:
+        return INDEX_ENTRY.unpack_from(self._mmap, HEADER.size + i * INDEX_ENTRY.size)
+
+    def _key(self, i: int) -> bytes:
+        key_offset, key_length, _, _ = self._entry(i)
+        return self._mmap[key_offset : key_offset + key_length]
+
+    def _record(self, i: int) -> Dict[str, Any]:
+        _, _, record_offset, record_length = self._entry(i)
+        record = self._mmap[record_offset : record_offset + record_length].decode()
+        name, region, country, lat, lng, population = record.split("\t")
+        return {
+            "name": name,
+            "region": region,
+            "country": country,
+            "lat": float(lat),
+            "lng": float(lng),
+            "population": int(population),
+        }
+
+    def _find_records(self, key: bytes) -> List[Dict[str, Any]]:
+        lo, hi = 0, self._num_entries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        records = []
+        while lo < self._num_entries and self._key(lo) == key:
+            records.append(self._record(lo))
+            lo += 1
+        return records
+
+    def lookup(
+        self,
+        location: str,
+        bias_lat: float | None = None,
+        bias_lng: float | None = None,
+    ) -> Dict[str, Any] | None:
+        """
+        Returns a Places details compatible result for `location` if it is clearly a city name, or None
+        if the caller should fall through to the Places API.
+        """
+        candidates = self._find_records(normalize_name(location).encode())
+        if not candidates:
+            return None
+
+        if bias_lat is not None and bias_lng is not None:
+            nearby_candidates = [
+                c
+                for c in candidates
+                if _haversine_km(bias_lat, bias_lng, c["lat"], c["lng"])
+                <= self.BIAS_RADIUS_KM
+            ]
+            candidates = nearby_candidates or candidates
+
+        candidates = sorted(candidates, key=lambda c: c["population"], reverse=True)
+        if (
+            len(candidates) > 1
+            and candidates[0]["population"]
+            < self.AMBIGUITY_RATIO * candidates[1]["population"]
+        ):
+            return None
+
+        return self._to_place_details(candidates[0])
+
+    def _to_place_details(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        # For the shape we mirror, see https://developers.google.com/maps/documentation/places/web-service/details#PlaceDetailsResponses
+        address_parts = [record["name"], record["region"], record["country"]]
+        return {
+            "name": record["name"],
+            "formatted_address": ", ".join(p for p in address_parts if p),
+            "geometry": {"location": {"lat": record["lat"], "lng": record["lng"]}},
+            "types": ["locality", "political"],
+        }
+
+
+def _haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    lng1, lat1, lng2, lat2 = map(radians, [lng1, lat1, lng2, lat2])
+    dlng = lng2 - lng1
+    dlat = lat2 - lat1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlng / 2) ** 2
+    return 2 * asin(sqrt(a)) * 6371
+
+
+def _read_geonames_tsv(path: str) -> Iterable[List[str]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            yield line.rstrip("\n").split("\t")
+
+
+def build_gazetteer(
+    cities_path: str, admin1_path: str, country_info_path: str, output_path: str
+) -> int:
+    """
+    Builds a gazetteer file from the GeoNames cities, admin1 codes and country info dumps.
+    Returns the number of index entries written.
+    """
+    # e.g. "US.CA" -> "California"
+    admin1_names = {row[0]: row[1] for row in _read_geonames_tsv(admin1_path)}
+    # e.g. "US" -> "United States"
+    country_names = {row[0]: row[4] for row in _read_geonames_tsv(country_info_path)}
+
+    records = bytearray()
+    entries: Dict[Tuple[bytes, int], int] = dict()
+    for row in _read_geonames_tsv(cities_path):
+        name, ascii_name, lat, lng = row[1], row[2], row[4], row[5]
+        country_code, admin1_code, population = row[8], row[10], row[14]
+
+        region = admin1_names.get(f"{country_code}.{admin1_code}", "")
+        country = country_names.get(country_code, country_code)
+        record = "\t".join([name, region, country, lat, lng, population]).encode()
+        record_offset = len(records)
+        records += record
+
+        region_names = [region] if region else []
+        if admin1_code and not admin1_code.isdigit():
+            # US states and a few other countries use readable codes, e.g. "TX"
+            region_names.append(admin1_code)
+        country_aliases = [
+            country_code,
+            country,
+            *COUNTRY_ALIASES.get(country_code, []),
+        ]
+
+        for city_name in {name, ascii_name}:
+            keys = {city_name}
+            keys.update(f"{city_name}, {c}" for c in country_aliases)
+            for region_name in region_names:
+                keys.add(f"{city_name}, {region_name}")
+                keys.update(f"{city_name}, {region_name}, {c}" for c in country_aliases)
+
+            for key in keys:
+                entries[(normalize_name(key).encode(), record_offset)] = len(record)
+
+    sorted_entries = sorted(entries.items())
+    keys_offset = HEADER.size + len(sorted_entries) * INDEX_ENTRY.size
+    keys_blob = bytearray()
+    key_offsets = dict()
+    for (key, _), _ in sorted_entries:
+        if key not in key_offsets:
+            key_offsets[key] = keys_offset + len(keys_blob)
+            keys_blob += key
+    records_offset = keys_offset + len(keys_blob)
+
+    with open(output_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(sorted_entries)))
+        for (key, record_offset), record_length in sorted_entries:
+            f.write(
+                INDEX_ENTRY.pack(
+                    key_offsets[key],
+                    len(key),
+                    records_offset + record_offset,
+                    record_length,
+                )
+            )
+        f.write(keys_blob)
+        f.write(records)
+
+    return len(sorted_entries)
+
+
+if __name__ == "__main__":
+    num_entries = build_gazetteer(*sys.argv[1:5])
+    print(f"Wrote {num_entries} gazetteer entries to {sys.argv[4]}")
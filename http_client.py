@@ -0,0 +1,75 @@
+"""
+A small pooled async HTTP client shared by the async tool methods.
+
+One `httpx.AsyncClient` is reused for every request so connections stay warm, and a semaphore per host
+caps how many requests can be in flight against any single upstream (ip-api, Google Places, ...).
+"""
+from typing import Any, Dict
+
+import asyncio
+
+from urllib.parse import urlsplit
+
+import httpx
+
+
+class AsyncHTTPClient:
+    def __init__(
+        self,
+        max_connections: int = 200,
+        max_connections_per_host: int = 50,
+        max_keepalive_connections: int = 50,
+        connect_timeout_s: float = 3.0,
+        read_timeout_s: float = 10.0,
+    ) -> None:
+        self.max_connections_per_host = max_connections_per_host
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.timeout = httpx.Timeout(
+            read_timeout_s, connect=connect_timeout_s, pool=connect_timeout_s
+        )
+
+        # The client and the semaphores are bound to the event loop they are first used on,
+        # so they are created lazily rather than in __init__
+        self._client: httpx.AsyncClient | None = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = dict()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+        return self._client
+
+    def _get_host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_connections_per_host)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def get(
+        self,
+        url: str,
+        params: Dict[str, Any] | None = None,
+        headers: Dict[str, str] | None = None,
+    ) -> httpx.Response:
+        async with self._get_host_semaphore(url):
+            return await self.client.get(url, params=params, headers=headers)
+
+    async def get_json(
+        self,
+        url: str,
+        params: Dict[str, Any] | None = None,
+        headers: Dict[str, str] | None = None,
+    ) -> Any:
+        response = await self.get(url, params=params, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
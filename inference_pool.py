@@ -0,0 +1,217 @@
+"""
+A pool of text generation inference (TGI) replicas behind a single `text_generation` method.
+
+Each request goes to the healthy replica with the fewest outstanding requests, ties broken by the lower moving
+average time to first token. A replica that fails several requests in a row is ejected from the pool and only
+comes back once its `/health` endpoint answers again. A stream that fails or times out before its first token
+is retried on another replica, since nothing has been shown to the user yet. The per-attempt timeout has to be
+shorter than the caller's deadline, otherwise a hung replica takes the whole request down with it.
+
+Point `RAVEN_ENDPOINT` or `SUMMARY_MODEL_ENDPOINT` at a comma separated list of endpoints to use more than one
+replica, e.g. the local fake servers from `fake_tgi_server.py`.
+"""
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from dataclasses import dataclass
+
+import asyncio
+
+import time
+
+from huggingface_hub import AsyncInferenceClient
+from huggingface_hub.utils import build_hf_headers
+
+from http_client import AsyncHTTPClient
+
+
+@dataclass
+class Replica:
+    endpoint: str
+    client: AsyncInferenceClient
+    outstanding: int = 0
+    # Moving average of the time to the first token, or to the whole response when not streaming
+    latency_s: float = 0.0
+    consecutive_failures: int = 0
+    ejected: bool = False
+    requests: int = 0
+    failures: int = 0
+
+
+class InferenceClientPool:
+    # Weight of the latest request in the moving average latency
+    LATENCY_SMOOTHING = 0.2
+
+    def __init__(
+        self,
+        endpoints: List[str],
+        token: str | None = None,
+        max_consecutive_failures: int = 3,
+        max_attempts: int = 2,
+        health_check_interval_s: float = 5.0,
+        first_token_timeout_s: float = 8.0,
+    ) -> None:
+        if not endpoints:
+            raise ValueError("An inference client pool needs at least one endpoint")
+
+        self.replicas = [
+            Replica(endpoint, AsyncInferenceClient(model=endpoint, token=token))
+            for endpoint in endpoints
+        ]
+        self.token = token
+        self.max_consecutive_failures = max_consecutive_failures
+        self.max_attempts = max_attempts
+        self.health_check_interval_s = health_check_interval_s
+        self.first_token_timeout_s = first_token_timeout_s
+
+        self._http = AsyncHTTPClient(connect_timeout_s=1.0, read_timeout_s=2.0)
+        self._health_check_task: asyncio.Task | None = None
+
+    def _pick_replica(self, tried: List[Replica]) -> Replica | None:
+        candidates = [r for r in self.replicas if r not in tried]
+        healthy = [r for r in candidates if not r.ejected]
+        # With every replica ejected, trying one beats failing outright
+        candidates = healthy or candidates
+        if not candidates:
+            return None
+        return min(candidates, key=lambda r: (r.outstanding, r.latency_s))
+
+    async def text_generation(self, prompt: str, **kwargs) -> Any:
+        """
+        Same interface as `AsyncInferenceClient.text_generation`.
+        """
+        tried: List[Replica] = []
+        while True:
+            replica = self._pick_replica(tried)
+            tried.append(replica)
+
+            replica.outstanding += 1
+            replica.requests += 1
+            start = time.monotonic()
+            try:
+                response, stream, first = await asyncio.wait_for(
+                    self._open(replica, prompt, **kwargs), self.first_token_timeout_s
+                )
+            except Exception as e:
+                replica.outstanding -= 1
+                if not _is_replica_failure(e):
+                    raise
+                if isinstance(e, asyncio.TimeoutError):
+                    # A hung replica must not keep winning ties on its latency
+                    self._record_latency(replica, time.monotonic() - start)
+                self._record_failure(replica)
+                if len(tried) >= self.max_attempts or self._pick_replica(tried) is None:
+                    raise
+                continue
+            except BaseException:
+                # Cancelled before the first token, most likely by the caller's deadline
+                replica.outstanding -= 1
+                self._record_latency(replica, time.monotonic() - start)
+                self._record_failure(replica)
+                raise
+
+            self._record_latency(replica, time.monotonic() - start)
+            if not kwargs.get("stream"):
+                replica.outstanding -= 1
+                self._record_success(replica)
+                return response
+            return self._iterate_stream(replica, first, stream)
+
+    async def _open(
+        self, replica: Replica, prompt: str, **kwargs
+    ) -> Tuple[Any, AsyncIterator | None, Any]:
+        response = await replica.client.text_generation(prompt, **kwargs)
+        if not kwargs.get("stream"):
+            return response, None, None
+
+        stream = response.__aiter__()
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = _END_OF_STREAM
+        return response, stream, first
+
+    async def _iterate_stream(
+        self, replica: Replica, first: Any, stream: AsyncIterator
+    ) -> AsyncIterator:
+        try:
+            if first is not _END_OF_STREAM:
+                yield first
+                async for item in stream:
+                    yield item
+        except Exception as e:
+            # Too late to retry, the caller has already seen part of the response
+            if _is_replica_failure(e):
+                self._record_failure(replica)
+            raise
+        else:
+            self._record_success(replica)
+        finally:
+            replica.outstanding -= 1
+
+    def _record_latency(self, replica: Replica, latency_s: float) -> None:
+        if replica.latency_s == 0.0:
+            replica.latency_s = latency_s
+        else:
+            replica.latency_s += self.LATENCY_SMOOTHING * (
+                latency_s - replica.latency_s
+            )
+
+    def _record_success(self, replica: Replica) -> None:
+        replica.consecutive_failures = 0
+
+    def _record_failure(self, replica: Replica) -> None:
+        replica.failures += 1
+        replica.consecutive_failures += 1
+        if (
+            not replica.ejected
+            and replica.consecutive_failures >= self.max_consecutive_failures
+        ):
+            replica.ejected = True
+            self._start_health_checks()
+
+    def _start_health_checks(self) -> None:
+        if self._health_check_task is None or self._health_check_task.done():
+            self._health_check_task = asyncio.create_task(self._run_health_checks())
+
+    async def _run_health_checks(self) -> None:
+        while any(r.ejected for r in self.replicas):
+            await asyncio.sleep(self.health_check_interval_s)
+            for replica in self.replicas:
+                if replica.ejected and await self._is_healthy(replica):
+                    replica.ejected = False
+                    replica.consecutive_failures = 0
+
+    async def _is_healthy(self, replica: Replica) -> bool:
+        try:
+            # Same headers as the inference client, protected endpoints answer 401 without the token
+            response = await self._http.get(
+                f"{replica.endpoint.rstrip('/')}/health",
+                headers=build_hf_headers(token=self.token),
+            )
+        except Exception:
+            return False
+        return response.is_success
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            r.endpoint: {
+                "outstanding": r.outstanding,
+                "latency_ms": round(r.latency_s * 1000, 1),
+                "requests": r.requests,
+                "failures": r.failures,
+                "ejected": r.ejected,
+            }
+            for r in self.replicas
+        }
+
+
+def _is_replica_failure(error: Exception) -> bool:
+    # Requests the replica rejected, e.g. a prompt that is too long, would fail on every replica
+    for e in (error, error.__cause__):
+        status_code = getattr(getattr(e, "response", None), "status_code", None)
+        if status_code is not None:
+            return status_code >= 500 or status_code == 429
+    return True
+
+
+_END_OF_STREAM = object()
@@ -0,0 +1,148 @@
+"""
+Opt-in memory profiling and payload size accounting, enabled with `MEMORY_PROFILING=1`.
+
+While enabled, `tracemalloc` traces every allocation and each request stage records how far memory rose above
+its starting level (peak) and how much of that it still held at the end (retained). `tracemalloc` only has one
+process wide peak, so a stage is only measured when no other stage ran at any point during it, stages that
+overlapped are counted as skipped instead. Under concurrent traffic most stages overlap, run
+`benchmark_memory.py`, which sends one request at a time, for a full per-stage breakdown. Payloads such as each tool's return value and the summary prompt are measured by their
+serialized JSON size. Tracing slows every allocation down, so leave this off in production.
+"""
+from typing import Any, Dict, Iterator
+
+from contextlib import contextmanager
+
+from dataclasses import dataclass
+
+import json
+
+import tracemalloc
+
+
+@dataclass
+class SizeStats:
+    count: int = 0
+    total: int = 0
+    max: int = 0
+
+    def add(self, size: int) -> None:
+        self.count += 1
+        self.total += size
+        self.max = max(self.max, size)
+
+    def to_dict(self, unit_bytes: int = 1024) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_kb": round(self.total / max(self.count, 1) / unit_bytes, 1),
+            "max_kb": round(self.max / unit_bytes, 1),
+        }
+
+
+def serialized_size(value: Any) -> int:
+    return len(json.dumps(value, default=str).encode())
+
+
+class MemoryProfiler:
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.stage_peaks: Dict[str, SizeStats] = dict()
+        self.stage_retained: Dict[str, SizeStats] = dict()
+        self.payloads: Dict[str, SizeStats] = dict()
+        # Stages that overlapped another stage, their peaks would include the other stage's allocations
+        self.stage_skipped: Dict[str, int] = dict()
+
+        self._num_active_stages = 0
+        self._num_started_stages = 0
+
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        # Resetting the peak while another stage is running would corrupt its measurement
+        alone = self._num_active_stages == 0
+        self._num_active_stages += 1
+        self._num_started_stages += 1
+        num_started_stages = self._num_started_stages
+        start, _ = tracemalloc.get_traced_memory()
+        if alone:
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            self._num_active_stages -= 1
+            current, peak = tracemalloc.get_traced_memory()
+            if alone and self._num_started_stages == num_started_stages:
+                self.stage_peaks.setdefault(name, SizeStats()).add(max(peak - start, 0))
+                self.stage_retained.setdefault(name, SizeStats()).add(
+                    max(current - start, 0)
+                )
+            else:
+                self.stage_skipped[name] = self.stage_skipped.get(name, 0) + 1
+
+    def record_payload(self, name: str, value: Any) -> int | None:
+        """
+        Records the serialized size of `value` under `name` and returns it, or None when disabled.
+        """
+        if not self.enabled:
+            return None
+
+        size = len(value.encode()) if isinstance(value, str) else serialized_size(value)
+        self.payloads.setdefault(name, SizeStats()).add(size)
+        return size
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"enabled": False}
+
+        current, _ = tracemalloc.get_traced_memory()
+        return {
+            "enabled": True,
+            "traced_kb": round(current / 1024, 1),
+            # Only stages that ran on their own, see `stage_skipped` for how many overlapped
+            "stages": {
+                name: {
+                    "peak": peaks.to_dict(),
+                    "retained": self.stage_retained[name].to_dict(),
+                }
+                for name, peaks in self.stage_peaks.items()
+            },
+            "stage_skipped": dict(self.stage_skipped),
+            "payloads": {
+                name: sizes.to_dict() for name, sizes in self.payloads.items()
+            },
+        }
+
+
+def format_report(stats: Dict[str, Any], max_payload_kb: float) -> str:
+    """
+    Formats `MemoryProfiler.stats()` as a plain text report, flagging payloads whose largest size is over
+    `max_payload_kb`.
+    """
+    if not stats["enabled"]:
+        return "Memory profiling is disabled, set MEMORY_PROFILING=1"
+
+    lines = [f"Traced memory: {stats['traced_kb']} KB", "", "Stage peaks (KB)"]
+    lines.append(f"  {'stage':<34}{'count':>7}{'mean':>10}{'max':>10}{'retained':>10}")
+    for name, stage in sorted(stats["stages"].items()):
+        peak, retained = stage["peak"], stage["retained"]
+        lines.append(
+            f"  {name:<34}{peak['count']:>7}{peak['mean_kb']:>10}{peak['max_kb']:>10}{retained['mean_kb']:>10}"
+        )
+    for name, count in sorted(stats.get("stage_skipped", dict()).items()):
+        lines.append(f"  {name:<34} {count} skipped, overlapped another stage")
+
+    lines += ["", "Payload sizes (KB)"]
+    lines.append(f"  {'payload':<34}{'count':>7}{'mean':>10}{'max':>10}")
+    for name, sizes in sorted(
+        stats["payloads"].items(), key=lambda item: item[1]["max_kb"], reverse=True
+    ):
+        flag = "  OVER LIMIT" if sizes["max_kb"] > max_payload_kb else ""
+        lines.append(
+            f"  {name:<34}{sizes['count']:>7}{sizes['mean_kb']:>10}{sizes['max_kb']:>10}{flag}"
+        )
+    return "\n".join(lines)
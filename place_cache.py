@@ -0,0 +1,162 @@
+"""
+A persistent place cache shared by every app process on the host.
+
+Entries live in a single SQLite database in WAL mode, so any number of workers can read concurrently while one
+writes. Values are stored as zlib-compressed compact JSON alongside their expiry time, and the least recently
+used entries are evicted once the database grows past its size bound.
+"""
+from typing import Any, Dict, Tuple
+
+import asyncio
+
+import json
+
+import sqlite3
+
+import threading
+
+import time
+
+import zlib
+
+
+class PlaceCache:
+    SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+"""
+
+    # Only record a read as an access this often, so hot keys do not turn every read into a write
+    ACCESS_RESOLUTION_S = 60
+    # Evicting down to a low water mark means we do not evict again on the very next write
+    EVICTION_LOW_WATER_MARK = 0.9
+    # Checking the total size is a full scan, so only do it every so many writes
+    EVICTION_CHECK_INTERVAL = 100
+
+    def __init__(self, path: str, max_size_bytes: int) -> None:
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+
+        self._local = threading.local()
+        self._writes_since_eviction_check = 0
+        self.hits = 0
+        self.misses = 0
+
+        with self._connection as connection:
+            connection.executescript(self.SCHEMA)
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared across threads, so each thread gets its own
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _serialize(self, value: Any) -> bytes:
+        return zlib.compress(
+            json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+        )
+
+    def _deserialize(self, blob: bytes) -> Any:
+        return json.loads(zlib.decompress(blob))
+
+    def get(self, namespace: str, key: str) -> Any | None:
+        entry = self.get_entry(namespace, key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, namespace: str, key: str) -> Tuple[Any, float] | None:
+        """
+        Like `get`, but returns a (value, expires_at) pair so callers can tell how old the value is.
+        """
+        now = time.time()
+        row = self._connection.execute(
+            "SELECT value, expires_at, last_access FROM entries WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None or row[1] < now:
+            self.misses += 1
+            return None
+
+        value, expires_at, last_access = row
+        if now - last_access > self.ACCESS_RESOLUTION_S:
+            self._connection.execute(
+                "UPDATE entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                (now, namespace, key),
+            )
+
+        self.hits += 1
+        return self._deserialize(value), expires_at
+
+    def set(self, namespace: str, key: str, value: Any, ttl_s: float) -> None:
+        now = time.time()
+        blob = self._serialize(value)
+        self._connection.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+            (namespace, key, blob, len(blob), now + ttl_s, now),
+        )
+
+        self._writes_since_eviction_check += 1
+        if self._writes_since_eviction_check >= self.EVICTION_CHECK_INTERVAL:
+            self._writes_since_eviction_check = 0
+            self.evict()
+
+    async def aget(self, namespace: str, key: str) -> Any | None:
+        return await asyncio.to_thread(self.get, namespace, key)
+
+    async def aget_entry(self, namespace: str, key: str) -> Tuple[Any, float] | None:
+        return await asyncio.to_thread(self.get_entry, namespace, key)
+
+    async def aset(self, namespace: str, key: str, value: Any, ttl_s: float) -> None:
+        await asyncio.to_thread(self.set, namespace, key, value, ttl_s)
+
+    def evict(self) -> None:
+        """
+        Drops expired entries, then the least recently used entries until we are back under the size bound.
+        """
+        connection = self._connection
+        connection.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+
+        total_size = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+        if total_size <= self.max_size_bytes:
+            return
+
+        to_free = total_size - int(self.max_size_bytes * self.EVICTION_LOW_WATER_MARK)
+        freed = 0
+        evicted = []
+        for namespace, key, size in connection.execute(
+            "SELECT namespace, key, size FROM entries ORDER BY last_access"
+        ):
+            if freed >= to_free:
+                break
+            evicted.append((namespace, key))
+            freed += size
+
+        connection.executemany(
+            "DELETE FROM entries WHERE namespace = ? AND key = ?", evicted
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        num_entries, total_size = self._connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        return {
+            "entries": num_entries,
+            "size_bytes": total_size,
+            "max_size_bytes": self.max_size_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,179 @@
+"""
+Quota-aware scheduling for Google Places calls.
+
+Every Places endpoint gets its own token bucket. Callers wait in a per-endpoint priority queue, so interactive
+requests are always granted before batch/replay traffic, and a caller is shed as soon as its estimated wait
+would run past its deadline instead of being sent to Google to fail on the QPS limit.
+"""
+from typing import Dict, List, Tuple
+
+from dataclasses import dataclass, field
+
+from enum import IntEnum
+
+import asyncio
+
+import heapq
+
+import itertools
+
+import threading
+
+import time
+
+from googlemaps.exceptions import ApiError
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+@dataclass
+class EndpointBudget:
+    queries_per_second: float
+    burst: int
+
+
+class PlacesRequestShedError(ApiError):
+    """
+    Raised instead of calling Google when a request cannot be scheduled before its deadline.
+    """
+
+    def __init__(self, endpoint: str, estimated_wait_s: float) -> None:
+        super().__init__(
+            "OVER_QUERY_LIMIT",
+            f"Shed `{endpoint}` request, estimated wait of {estimated_wait_s:.2f}s exceeds its deadline",
+        )
+
+
+@dataclass
+class _EndpointState:
+    budget: EndpointBudget
+    tokens: float
+    last_refill: float
+    waiters: List[Tuple[int, int]] = field(default_factory=list)
+    granted: int = 0
+    shed: int = 0
+    total_wait_s: float = 0.0
+    max_wait_s: float = 0.0
+
+    def refill(self, now: float) -> None:
+        elapsed = now - self.last_refill
+        self.tokens = min(
+            self.budget.burst, self.tokens + elapsed * self.budget.queries_per_second
+        )
+        self.last_refill = now
+
+    def position(self, waiter: Tuple[int, int]) -> int:
+        return sum(1 for w in self.waiters if w < waiter)
+
+
+class PlacesScheduler:
+    def __init__(
+        self,
+        budgets: Dict[str, EndpointBudget],
+        max_wait_s: Dict[Priority, float],
+    ) -> None:
+        self.max_wait_s = max_wait_s
+
+        now = time.monotonic()
+        self._endpoints = {
+            endpoint: _EndpointState(
+                budget=budget, tokens=float(budget.burst), last_refill=now
+            )
+            for endpoint, budget in budgets.items()
+        }
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    async def aacquire(
+        self, endpoint: str, priority: Priority = Priority.INTERACTIVE
+    ) -> None:
+        """
+        Waits until `endpoint` has budget for one more call.
+        """
+        waiter, enqueued_at, deadline = self._enqueue(endpoint, priority)
+        try:
+            while True:
+                sleep_s = self._try_acquire(endpoint, waiter, enqueued_at, deadline)
+                if sleep_s is None:
+                    return
+                await asyncio.sleep(sleep_s)
+        except asyncio.CancelledError:
+            self._dequeue(endpoint, waiter)
+            raise
+
+    def _enqueue(
+        self, endpoint: str, priority: Priority
+    ) -> Tuple[Tuple[int, int], float, float]:
+        waiter = (int(priority), next(self._sequence))
+        enqueued_at = time.monotonic()
+        deadline = enqueued_at + self.max_wait_s[priority]
+        with self._lock:
+            heapq.heappush(self._endpoints[endpoint].waiters, waiter)
+        return waiter, enqueued_at, deadline
+
+    def _dequeue(self, endpoint: str, waiter: Tuple[int, int]) -> None:
+        with self._lock:
+            state = self._endpoints[endpoint]
+            if waiter in state.waiters:
+                state.waiters.remove(waiter)
+                heapq.heapify(state.waiters)
+
+    def _try_acquire(
+        self,
+        endpoint: str,
+        waiter: Tuple[int, int],
+        enqueued_at: float,
+        deadline: float,
+    ) -> float | None:
+        """
+        Returns None once the waiter has been granted a token, otherwise how long to sleep before retrying.
+        """
+        state = self._endpoints[endpoint]
+        with self._lock:
+            now = time.monotonic()
+            state.refill(now)
+
+            if state.waiters[0] == waiter and state.tokens >= 1:
+                heapq.heappop(state.waiters)
+                state.tokens -= 1
+                wait_s = now - enqueued_at
+                state.granted += 1
+                state.total_wait_s += wait_s
+                state.max_wait_s = max(state.max_wait_s, wait_s)
+                return None
+
+            # Everyone ahead of us needs a token too, so that is the earliest we could be served
+            qps = state.budget.queries_per_second
+            tokens_needed = state.position(waiter) + 1 - state.tokens
+            estimated_wait_s = max(tokens_needed, 0) / qps
+            if now + estimated_wait_s > deadline:
+                state.waiters.remove(waiter)
+                heapq.heapify(state.waiters)
+                state.shed += 1
+                raise PlacesRequestShedError(endpoint, estimated_wait_s)
+
+        return max(min(estimated_wait_s, 1 / qps), 0.001)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        stats = dict()
+        with self._lock:
+            now = time.monotonic()
+            for endpoint, state in self._endpoints.items():
+                state.refill(now)
+                stats[endpoint] = {
+                    "queue_depth": len(state.waiters),
+                    "interactive_queue_depth": sum(
+                        1 for w in state.waiters if w[0] == Priority.INTERACTIVE
+                    ),
+                    "available_tokens": round(state.tokens, 2),
+                    "granted": state.granted,
+                    "shed": state.shed,
+                    "mean_wait_ms": round(
+                        1000 * state.total_wait_s / max(state.granted, 1), 2
+                    ),
+                    "max_wait_ms": round(1000 * state.max_wait_s, 2),
+                }
+        return stats
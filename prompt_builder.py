@@ -0,0 +1,285 @@
+"""
+Builds the Raven prompt from the `Tools` function definitions.
+
+In "full" mode every function is sent with its full docstring, exactly like the original prompt. The "selected"
+mode only sends the functions a cheap keyword classifier thinks the query can use, and "compact" additionally
+condenses the docstrings, both to cut the prefill cost of the function definitions that prefix every query.
+"""
+from typing import Dict, FrozenSet, List, Set
+
+from dataclasses import dataclass
+
+from functools import lru_cache
+
+import inspect
+
+import re
+
+
+PROMPT_MODES = ["full", "selected", "compact"]
+RAVEN_TOKENIZER = "Nexusflow/NexusRaven-V2-13B"
+
+# Functions that are always worth sending, they are short and Raven falls back on them
+ALWAYS_SELECTED = {"get_current_location"}
+# Words that suggest a query needs a function. Matched against lowercased whole words or phrases
+FUNCTION_KEYWORDS = {
+    "get_current_location": [],
+    "sort_results": [
+        "best",
+        "top",
+        "good",
+        "great",
+        "highest",
+        "lowest",
+        "rated",
+        "rating",
+        "cheap",
+        "cheaper",
+        "cheapest",
+        "expensive",
+        "price",
+        "closest",
+        "nearest",
+        "sort",
+        "most",
+        "least",
+    ],
+    "get_latitude_longitude": ["coordinates", "latitude", "longitude", "where is"],
+    "get_distance": [
+        "distance",
+        "far",
+        "how far",
+        "between",
+        "miles",
+        "km",
+        "kilometers",
+    ],
+    "get_recommendations": [
+        "recommend",
+        "recommendation",
+        "recommendations",
+        "suggest",
+        "suggestions",
+        "ideas",
+        "things to do",
+    ],
+    "find_places_near_location": [
+        "find",
+        "near",
+        "nearby",
+        "around",
+        "close to",
+        "within",
+        "places",
+        "place",
+        "restaurant",
+        "restaurants",
+        "food",
+        "eat",
+        "cafe",
+        "coffee",
+        "bar",
+        "bars",
+        "hotel",
+        "hotels",
+        "hostel",
+        "hostels",
+        "shop",
+        "shops",
+        "store",
+        "stores",
+        "museum",
+        "museums",
+        "park",
+        "parks",
+        "list",
+    ],
+    "get_some_reviews": [
+        "review",
+        "reviews",
+        "saying",
+        "say",
+        "opinion",
+        "opinions",
+        "feedback",
+        "think",
+        "thoughts",
+        "compare",
+        "experience",
+        "experiences",
+    ],
+}
+# Searching for places is the default intent, these functions are selected together
+SEARCH_FUNCTIONS = {
+    "get_recommendations",
+    "find_places_near_location",
+    "get_latitude_longitude",
+}
+# Functions whose arguments are usually produced by other functions
+FUNCTION_DEPENDENCIES = {
+    "get_recommendations": {"get_latitude_longitude"},
+    "sort_results": SEARCH_FUNCTIONS,
+}
+
+
+EMPHASIS_PATTERN = re.compile(r"\b(?!API\b)[A-Z]{2,}\b")
+
+
+@dataclass
+class RavenPrompt:
+    prompt: str
+    function_names: List[str]
+    prefix_tokens: int
+
+
+@lru_cache(maxsize=1)
+def _get_tokenizer():
+    try:
+        from transformers import AutoTokenizer
+
+        return AutoTokenizer.from_pretrained(RAVEN_TOKENIZER)
+    except Exception:
+        # Offline or transformers is not installed, fall back to an estimate
+        return None
+
+
+def count_tokens(text: str) -> int:
+    tokenizer = _get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    # Roughly one token per word or punctuation mark
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def select_functions(query: str, function_names: List[str]) -> List[str]:
+    """
+    Keyword classifier for the functions a query can use. Errs on the side of selecting too much, and selects
+    every function when it cannot tell.
+    """
+    query = " ".join(re.findall(r"\w+", query.lower()))
+    selected: Set[str] = set(ALWAYS_SELECTED)
+    for name in function_names:
+        keywords = FUNCTION_KEYWORDS.get(name, [])
+        if any(re.search(rf"\b{re.escape(keyword)}\b", query) for keyword in keywords):
+            selected.add(name)
+
+    if not selected & {"get_some_reviews", "get_distance"}:
+        selected |= SEARCH_FUNCTIONS
+
+    for name in list(selected):
+        selected |= FUNCTION_DEPENDENCIES.get(name, set())
+
+    if selected == ALWAYS_SELECTED:
+        selected = set(function_names)
+
+    return [name for name in function_names if name in selected]
+
+
+def _condense_sentences(text: str) -> str:
+    sentences = re.split(r"(?<=[.!?])\s+", text.strip())
+    # A leading "Optional." on its own says nothing about the argument
+    num_leading = 2 if _is_short(sentences[0]) else 1
+    kept = sentences[:num_leading] + [
+        s for s in sentences[num_leading:] if EMPHASIS_PATTERN.search(s) or _is_short(s)
+    ]
+    return " ".join(kept)
+
+
+def _is_short(sentence: str) -> bool:
+    return len(sentence.split()) < 3
+
+
+def condense_docstring(docstring: str) -> str:
+    """
+    Keeps the first sentence of the description and of each argument, plus any sentence with an emphasized
+    (ALL CAPS) word, since those are the constraints Raven relies on, and short notes such as "Optional
+    argument.". Guidance lines that are neither the description nor an argument are kept as they are.
+    """
+    lines = [line.strip() for line in docstring.splitlines() if line.strip()]
+    condensed_lines = []
+    for i, line in enumerate(lines):
+        if i == 0:
+            line = _condense_sentences(line)
+        elif line.startswith("-"):
+            # Only the text after "- name (type):" describes the argument
+            argument, separator, description = line.partition(":")
+            if separator:
+                line = f"{argument}{separator} {_condense_sentences(description)}"
+        condensed_lines.append(line)
+
+    return "\n".join(condensed_lines)
+
+
+class PromptBuilder:
+    FUNCTION_DEFINITION_TEMPLATE = '''Function:
+def {name}{signature}:
+"""
+{docstring}
+"""
+
+'''
+    PROMPT_TEMPLATE = """{function_definitions}User Query: {query}<human_end>Call:"""
+
+    def __init__(
+        self, tools_class: type, function_names: List[str], mode: str = "full"
+    ) -> None:
+        if mode not in PROMPT_MODES:
+            raise ValueError(
+                f"Unknown prompt mode `{mode}`, expected one of {PROMPT_MODES}"
+            )
+
+        self.function_names = function_names
+        self.mode = mode
+
+        self._function_definitions: Dict[str, str] = dict()
+        for name in function_names:
+            f = getattr(tools_class, name)
+            signature = inspect.signature(f)
+            # Drop `self`, the definitions read as plain functions
+            signature = signature.replace(
+                parameters=list(signature.parameters.values())[1:]
+            )
+            docstring = inspect.getdoc(f)
+            if mode == "compact":
+                docstring = condense_docstring(docstring)
+
+            self._function_definitions[name] = self.FUNCTION_DEFINITION_TEMPLATE.format(
+                name=name, signature=signature, docstring=docstring
+            )
+
+        # Loading the tokenizer can mean downloading it, which has to happen at startup rather than on the first
+        # request. The full set of functions is the only prefix every mode can send, so count it up front as well
+        _get_tokenizer()
+        self._prefix_tokens: Dict[FrozenSet[str], int] = {
+            frozenset(function_names): count_tokens(
+                "".join(self._function_definitions.values())
+            )
+        }
+
+    def build(self, query: str) -> RavenPrompt:
+        """
+        Tokenizes the function definitions the first time a set of them is selected, so call this off the event
+        loop.
+        """
+        if self.mode == "full":
+            function_names = self.function_names
+        else:
+            function_names = select_functions(query, self.function_names)
+
+        function_definitions = "".join(
+            self._function_definitions[name] for name in function_names
+        )
+        prompt = self.PROMPT_TEMPLATE.format(
+            function_definitions=function_definitions, query=query
+        )
+
+        key = frozenset(function_names)
+        if key not in self._prefix_tokens:
+            self._prefix_tokens[key] = count_tokens(function_definitions)
+
+        return RavenPrompt(
+            prompt=prompt,
+            function_names=function_names,
+            prefix_tokens=self._prefix_tokens[key],
+        )
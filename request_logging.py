@@ -0,0 +1,110 @@
+"""
+Structured request logging that stays off the request path.
+
+Records are put on an in-memory queue by a `QueueHandler` and written to stdout as one JSON object per line by a
+`QueueListener` thread, so a slow terminal or disk never adds latency to a request. Each request logs one event
+per stage with its elapsed time. Large payloads such as the full prompts are only logged for a sampled fraction
+of requests, every other request logs just their size.
+"""
+from typing import Any, Dict
+
+import atexit
+
+import json
+
+import logging
+
+import queue
+
+import random
+
+import sys
+
+import time
+
+import uuid
+
+from logging.handlers import QueueHandler, QueueListener
+
+
+LOGGER_NAME = "nexus"
+
+_listener: QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(level: int = logging.INFO) -> None:
+    """
+    Routes every `nexus` logger through a background writer thread. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    # Unbounded, a full queue would block the request that is logging
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.addHandler(QueueHandler(log_queue))
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def log_event(
+    logger: logging.Logger, event: str, level: int = logging.INFO, **fields
+) -> None:
+    logger.log(level, event, extra={"fields": fields})
+
+
+class RequestLogger:
+    """
+    Logs the stages of a single request. Whether the request's payloads are logged in full is decided once,
+    so a sampled request has all of its payloads.
+    """
+
+    def __init__(self, logger: logging.Logger, payload_sample_rate: float) -> None:
+        self.logger = logger
+        self.request_id = uuid.uuid4().hex[:12]
+        self.log_payloads = random.random() < payload_sample_rate
+        self._start = time.monotonic()
+
+    def event(self, stage: str, level: int = logging.INFO, **fields) -> None:
+        log_event(
+            self.logger,
+            stage,
+            level,
+            request_id=self.request_id,
+            elapsed_ms=round((time.monotonic() - self._start) * 1000, 1),
+            **fields,
+        )
+
+    def payload(self, stage: str, name: str, payload: str, **fields) -> None:
+        """
+        Logs `payload` in full if this request is sampled, otherwise only its size.
+        """
+        payload_fields: Dict[str, Any] = {f"{name}_chars": len(payload)}
+        if self.log_payloads:
+            payload_fields[name] = payload
+        self.event(stage, **fields, **payload_fields)
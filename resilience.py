@@ -0,0 +1,272 @@
+"""
+Deadlines, circuit breakers and hedged requests for the external endpoints the demo depends on.
+
+Every call to ip-api, Google Places, Raven or the summary model goes through a shared `ResilienceLayer`. A call
+that runs past its endpoint's deadline fails with `EndpointTimeoutError`, and any other failure of the endpoint
+is raised as `EndpointUnavailableError` with the original error as its cause. Once an endpoint keeps failing its
+circuit opens and calls fail immediately with `EndpointUnavailableError` until a trial call succeeds again,
+so callers only need to handle the one error to go straight to their fallback.
+"""
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    NoReturn,
+    Tuple,
+    TypeVar,
+)
+
+from dataclasses import dataclass
+
+import asyncio
+
+import threading
+
+import time
+
+
+T = TypeVar("T")
+
+
+class EndpointUnavailableError(Exception):
+    pass
+
+
+class EndpointTimeoutError(EndpointUnavailableError):
+    pass
+
+
+@dataclass
+class EndpointPolicy:
+    # For streams this is the deadline for the first item, later items get `idle_timeout_s` each
+    deadline_s: float
+    failure_threshold: int = 5
+    reset_timeout_s: float = 30.0
+    # If set, a duplicate request is sent when the first has not finished after this long
+    hedge_after_s: float | None = None
+    idle_timeout_s: float | None = None
+
+
+DEFAULT_ENDPOINT_POLICIES = {
+    "ip_api": EndpointPolicy(deadline_s=2.0, hedge_after_s=0.5),
+    "places": EndpointPolicy(deadline_s=5.0),
+    "raven": EndpointPolicy(deadline_s=20.0, idle_timeout_s=10.0),
+    "summary": EndpointPolicy(deadline_s=20.0, idle_timeout_s=10.0),
+}
+
+
+def _always(_: Exception) -> bool:
+    return True
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout_s: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if (
+                self.state == self.OPEN
+                and time.monotonic() - self.opened_at >= self.reset_timeout_s
+            ):
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                # Let a single trial call through to find out if the endpoint has recovered
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def release_trial(self) -> None:
+        """
+        Called when a call was cancelled by its caller before the endpoint answered.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if (
+                self.state == self.HALF_OPEN
+                or self.consecutive_failures >= self.failure_threshold
+            ):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class ResilienceLayer:
+    def __init__(self, policies: Dict[str, EndpointPolicy]) -> None:
+        self.policies = policies
+        self.breakers = {
+            endpoint: CircuitBreaker(policy.failure_threshold, policy.reset_timeout_s)
+            for endpoint, policy in policies.items()
+        }
+        self.counters = {
+            endpoint: {
+                "calls": 0,
+                "failures": 0,
+                "timeouts": 0,
+                "rejected": 0,
+                "hedged": 0,
+            }
+            for endpoint in policies
+        }
+
+    def _check_breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self.breakers[endpoint]
+        self.counters[endpoint]["calls"] += 1
+        if not breaker.allow():
+            self.counters[endpoint]["rejected"] += 1
+            raise EndpointUnavailableError(f"Circuit for `{endpoint}` is open")
+        return breaker
+
+    def _raise_failure(
+        self,
+        endpoint: str,
+        breaker: CircuitBreaker,
+        error: Exception,
+        is_failure: Callable[[Exception], bool],
+    ) -> NoReturn:
+        if not is_failure(error):
+            # e.g. a rejected request, which says nothing about the endpoint's health
+            breaker.record_success()
+            raise error
+
+        breaker.record_failure()
+        self.counters[endpoint]["failures"] += 1
+        if isinstance(error, EndpointTimeoutError):
+            self.counters[endpoint]["timeouts"] += 1
+        if isinstance(error, EndpointUnavailableError):
+            raise error
+        raise EndpointUnavailableError(f"`{endpoint}` failed: {error!r}") from error
+
+    async def call(
+        self,
+        endpoint: str,
+        make_call: Callable[[], Awaitable[T]],
+        is_failure: Callable[[Exception], bool] = _always,
+    ) -> T:
+        """
+        Awaits `make_call()` within the endpoint's deadline, hedging it if the policy asks for it.
+        `make_call` may be called more than once, so it must be safe to repeat. Exceptions for which
+        `is_failure` returns False are re-raised as they are without counting against the circuit, any other
+        exception is raised as `EndpointUnavailableError`.
+        """
+        breaker = self._check_breaker(endpoint)
+        try:
+            result = await self._call_with_deadline(endpoint, make_call)
+        except asyncio.CancelledError:
+            breaker.release_trial()
+            raise
+        except Exception as e:
+            self._raise_failure(endpoint, breaker, e, is_failure)
+        breaker.record_success()
+        return result
+
+    async def _call_with_deadline(
+        self, endpoint: str, make_call: Callable[[], Awaitable[T]]
+    ) -> T:
+        policy = self.policies[endpoint]
+        deadline = time.monotonic() + policy.deadline_s
+
+        attempts = [asyncio.ensure_future(make_call())]
+        try:
+            if policy.hedge_after_s is not None:
+                done, _ = await asyncio.wait(attempts, timeout=policy.hedge_after_s)
+                if not done:
+                    self.counters[endpoint]["hedged"] += 1
+                    attempts.append(asyncio.ensure_future(make_call()))
+
+            while attempts:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                done, _ = await asyncio.wait(
+                    attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
+                for attempt in done:
+                    attempts.remove(attempt)
+                    if attempt.exception() is None:
+                        return attempt.result()
+                    if not attempts:
+                        raise attempt.exception()
+
+            raise EndpointTimeoutError(
+                f"`{endpoint}` did not respond within {policy.deadline_s}s"
+            )
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    async def stream(
+        self,
+        endpoint: str,
+        open_stream: Callable[[], Awaitable[AsyncIterator[T]]],
+        is_failure: Callable[[Exception], bool] = _always,
+    ) -> AsyncIterator[T]:
+        """
+        Iterates the stream returned by `open_stream()`. The first item must arrive within the endpoint's
+        deadline, which is also where hedging applies, and every later item within its idle timeout.
+        """
+
+        async def open_and_get_first() -> Tuple[AsyncIterator[T], Any]:
+            iterator = (await open_stream()).__aiter__()
+            try:
+                first = await iterator.__anext__()
+            except StopAsyncIteration:
+                return iterator, _END_OF_STREAM
+            return iterator, first
+
+        iterator, item = await self.call(endpoint, open_and_get_first, is_failure)
+        breaker = self.breakers[endpoint]
+        idle_timeout_s = self.policies[endpoint].idle_timeout_s
+        while item is not _END_OF_STREAM:
+            yield item
+            try:
+                item = await asyncio.wait_for(iterator.__anext__(), idle_timeout_s)
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                error = EndpointTimeoutError(
+                    f"`{endpoint}` stalled for more than {idle_timeout_s}s"
+                )
+                self._raise_failure(endpoint, breaker, error, is_failure)
+            except Exception as e:
+                self._raise_failure(endpoint, breaker, e, is_failure)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            endpoint: {
+                "state": self.breakers[endpoint].state,
+                "consecutive_failures": self.breakers[endpoint].consecutive_failures,
+                **counters,
+            }
+            for endpoint, counters in self.counters.items()
+        }
+
+
+_END_OF_STREAM = object()
@@ -0,0 +1,102 @@
+"""
+Picks the reviews `get_some_reviews` passes on to the summary model.
+
+Places returns up to five reviews per place, often with near identical text. Rather than passing all of them in a
+random order, each place keeps its best few distinct reviews, ranked by recency, length and rating, and the
+places take turns so none of them crowds out the others. The selection only depends on the reviews themselves,
+so the same places always produce the same summary prompt.
+"""
+from typing import Any, Dict, List, Set, Tuple
+
+import math
+
+import re
+
+
+REVIEWS_PER_PLACE = 3
+MAX_REVIEWS = 10
+REVIEW_MAX_CHARS = 500
+# Reviews sharing at least this fraction of their word shingles are considered duplicates
+DUPLICATE_SIMILARITY = 0.7
+SHINGLE_SIZE = 3
+# A review this much older than the newest review of the same place counts half as recent
+RECENCY_HALF_LIFE_S = 365 * 24 * 60 * 60
+RANKING_WEIGHTS = {"recency": 1.0, "length": 1.0, "rating": 0.5}
+
+
+def select_reviews(places: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Given (place name, place details) pairs, returns at most `REVIEWS_PER_PLACE` distinct reviews per place,
+    interleaved across places and truncated to `REVIEW_MAX_CHARS`. The place details are not modified.
+    """
+    seen_shingles: List[Set[Tuple[str, ...]]] = []
+    selected_by_place = []
+    for place_name, place_details in places:
+        selected = []
+        for review in _rank_reviews(place_details.get("reviews", [])):
+            if len(selected) == REVIEWS_PER_PLACE:
+                break
+
+            shingles = _get_shingles(review["text"])
+            if any(
+                _similarity(shingles, other) >= DUPLICATE_SIMILARITY
+                for other in seen_shingles
+            ):
+                continue
+            seen_shingles.append(shingles)
+
+            selected.append(
+                {
+                    **review,
+                    "text": truncate_review(review["text"]),
+                    "for_location": place_name,
+                    "formatted_address": place_details["formatted_address"],
+                }
+            )
+        selected_by_place.append(selected)
+
+    interleaved = []
+    for i in range(REVIEWS_PER_PLACE):
+        interleaved.extend(
+            selected[i] for selected in selected_by_place if i < len(selected)
+        )
+    return interleaved[:MAX_REVIEWS]
+
+
+def truncate_review(text: str) -> str:
+    if len(text) <= REVIEW_MAX_CHARS:
+        return text
+    return text[:REVIEW_MAX_CHARS].rsplit(" ", 1)[0].rstrip(" ,.;:") + "..."
+
+
+def _rank_reviews(reviews: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Rating only reviews have nothing to summarize
+    reviews = [r for r in reviews if r.get("text", "").strip()]
+    newest = max((r.get("time", 0) for r in reviews), default=0)
+
+    def score(review: Dict[str, Any]) -> float:
+        age_s = max(newest - review.get("time", 0), 0)
+        recency = math.pow(0.5, age_s / RECENCY_HALF_LIFE_S)
+        length = min(len(review["text"]) / REVIEW_MAX_CHARS, 1.0)
+        rating = (review.get("rating") or 0) / 5
+        return (
+            RANKING_WEIGHTS["recency"] * recency
+            + RANKING_WEIGHTS["length"] * length
+            + RANKING_WEIGHTS["rating"] * rating
+        )
+
+    # The text breaks ties, so the order never depends on the order Places returned
+    return sorted(reviews, key=lambda r: (-score(r), r["text"]))
+
+
+def _get_shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)}
+    return {
+        tuple(words[i : i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def _similarity(a: Set[Tuple[str, ...]], b: Set[Tuple[str, ...]]) -> float:
+    return len(a & b) / len(a | b)
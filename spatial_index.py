@@ -0,0 +1,287 @@
+"""
+An in-process spatial index over places returned by previous nearby searches.
+
+Places are bucketed into a geohash grid per keyword. A nearby search that returned every matching place, i.e.
+less than a full page and no `next_page_token`, is also recorded as a coverage circle for its keyword, and a
+later radius query is answered locally only when it falls entirely inside a fresh coverage circle for the same
+keyword. Candidates come from the grid cells overlapping the query and are then filtered with an exact haversine
+distance. A truncated search only holds Google's most prominent places, so it is only reused for the exact same
+search. Expired entries are pruned across every keyword every few minutes, so the index only ever holds the last
+`coverage_ttl_s` worth of searches.
+"""
+from typing import Any, Dict, List, Set, Tuple
+
+from dataclasses import dataclass, field
+
+from math import degrees, radians, cos, sin, asin, sqrt
+
+import threading
+
+import time
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_M = 6371000
+# Searches whose centers are closer than this are considered the same search
+SAME_CENTER_M = 1.0
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    lng1, lat1, lng2, lat2 = map(radians, [lng1, lat1, lng2, lat2])
+    dlng = lng2 - lng1
+    dlat = lat2 - lat1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlng / 2) ** 2
+    return 2 * asin(sqrt(a)) * EARTH_RADIUS_M
+
+
+def geohash_encode(lat: float, lng: float, precision: int) -> str:
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    num_bits = 0
+    even = True
+    while len(geohash) < precision:
+        value, value_range = (lng, lng_range) if even else (lat, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            value_range[0] = mid
+        else:
+            value_range[1] = mid
+
+        even = not even
+        num_bits += 1
+        if num_bits == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            num_bits = 0
+
+    return "".join(geohash)
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """
+    Returns the (lat, lng) size in degrees of a geohash cell at `precision`.
+    """
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180 / 2**lat_bits, 360 / 2**lng_bits
+
+
+@dataclass
+class _Coverage:
+    lat: float
+    lng: float
+    radius_m: float
+    fetched_at: float
+
+
+@dataclass
+class _Search:
+    lat: float
+    lng: float
+    radius_m: float
+    fetched_at: float
+    places: List[Dict[str, Any]]
+
+
+@dataclass
+class _KeywordIndex:
+    cells: Dict[str, Dict[str, Dict[str, Any]]] = field(default_factory=dict)
+    coverages: List[_Coverage] = field(default_factory=list)
+    # Truncated searches, only reused for the exact same search
+    searches: List[_Search] = field(default_factory=list)
+
+
+class SpatialPlaceIndex:
+    def __init__(
+        self,
+        precision: int = 4,
+        coverage_ttl_s: float = 60 * 60,
+        prune_interval_s: float = 5 * 60,
+    ) -> None:
+        self.precision = precision
+        self.coverage_ttl_s = coverage_ttl_s
+        self.prune_interval_s = prune_interval_s
+
+        self._keywords: Dict[str, _KeywordIndex] = dict()
+        self._lock = threading.Lock()
+        self._last_prune = time.time()
+        self.hits = 0
+        self.misses = 0
+
+    def _normalize_keyword(self, keyword: str) -> str:
+        return " ".join(keyword.lower().split())
+
+    def _cells_overlapping(self, lat: float, lng: float, radius_m: float) -> Set[str]:
+        lat_delta = degrees(radius_m / EARTH_RADIUS_M)
+        lng_delta = lat_delta / max(cos(radians(lat)), 1e-6)
+        lat_step, lng_step = geohash_cell_size(self.precision)
+
+        min_lat, max_lat = max(lat - lat_delta, -90.0), min(lat + lat_delta, 90.0)
+        min_lng, max_lng = max(lng - lng_delta, -180.0), min(lng + lng_delta, 180.0)
+
+        cells = set()
+        cell_lat = min_lat
+        while True:
+            cell_lng = min_lng
+            while True:
+                cells.add(geohash_encode(cell_lat, cell_lng, self.precision))
+                if cell_lng >= max_lng:
+                    break
+                cell_lng = min(cell_lng + lng_step, max_lng)
+            if cell_lat >= max_lat:
+                break
+            cell_lat = min(cell_lat + lat_step, max_lat)
+
+        return cells
+
+    def add(
+        self,
+        keyword: str,
+        lat: float,
+        lng: float,
+        radius_m: float,
+        places: List[Dict[str, Any]],
+        complete: bool = True,
+        fetched_at: float | None = None,
+    ) -> None:
+        """
+        Records a nearby search for `keyword` around (lat, lng) and the places it returned. `complete` is False
+        when the search may have left out matching places, and `fetched_at` is when the response came from Google
+        if it was served from a cache.
+        """
+        now = time.time()
+        if fetched_at is None:
+            fetched_at = now
+        if now - fetched_at >= self.coverage_ttl_s:
+            return
+
+        keyword = self._normalize_keyword(keyword)
+        with self._lock:
+            # Keywords that are never searched again would otherwise keep their places forever
+            if now - self._last_prune >= self.prune_interval_s:
+                self._prune(now)
+
+            index = self._keywords.setdefault(keyword, _KeywordIndex())
+            self._prune_keyword(index, now)
+            index.searches = [
+                s
+                for s in index.searches
+                if not self._is_same_search(s, lat, lng, radius_m)
+            ]
+            if not complete:
+                # Copied, callers annotate the places they are given
+                index.searches.append(
+                    _Search(lat, lng, radius_m, fetched_at, [dict(p) for p in places])
+                )
+                return
+
+            index.coverages.append(_Coverage(lat, lng, radius_m, fetched_at))
+            for place in places:
+                place_location = place["geometry"]["location"]
+                cell = geohash_encode(
+                    place_location["lat"], place_location["lng"], self.precision
+                )
+                place_id = place.get("place_id", place.get("name"))
+                index.cells.setdefault(cell, dict())[place_id] = dict(
+                    place, _indexed_at=fetched_at
+                )
+
+    def _prune(self, now: float) -> None:
+        for keyword, index in list(self._keywords.items()):
+            self._prune_keyword(index, now)
+            if not (index.cells or index.coverages or index.searches):
+                del self._keywords[keyword]
+        self._last_prune = now
+
+    def _prune_keyword(self, index: _KeywordIndex, now: float) -> None:
+        index.coverages = [
+            c for c in index.coverages if now - c.fetched_at < self.coverage_ttl_s
+        ]
+        index.searches = [
+            s for s in index.searches if now - s.fetched_at < self.coverage_ttl_s
+        ]
+        for cell, cell_places in list(index.cells.items()):
+            for place_id in [
+                place_id
+                for place_id, place in cell_places.items()
+                if now - place["_indexed_at"] >= self.coverage_ttl_s
+            ]:
+                del cell_places[place_id]
+            if not cell_places:
+                del index.cells[cell]
+
+    def _is_same_search(
+        self, search: _Search, lat: float, lng: float, radius_m: float
+    ) -> bool:
+        return (
+            search.radius_m == radius_m
+            and haversine_m(search.lat, search.lng, lat, lng) < SAME_CENTER_M
+        )
+
+    def query(
+        self, keyword: str, lat: float, lng: float, radius_m: float
+    ) -> List[Dict[str, Any]] | None:
+        """
+        Returns the indexed places for `keyword` within `radius_m` of (lat, lng), or None when the index has no
+        fresh coverage for the whole query circle, nor the same search, and the API should be called instead.
+        """
+        now = time.time()
+        keyword = self._normalize_keyword(keyword)
+        with self._lock:
+            index = self._keywords.get(keyword)
+            if index is None:
+                self.misses += 1
+                return None
+
+            for search in index.searches:
+                if now - search.fetched_at < self.coverage_ttl_s and (
+                    self._is_same_search(search, lat, lng, radius_m)
+                ):
+                    self.hits += 1
+                    return [dict(place) for place in search.places]
+
+            covered = any(
+                now - c.fetched_at < self.coverage_ttl_s
+                and haversine_m(c.lat, c.lng, lat, lng) + radius_m <= c.radius_m
+                for c in index.coverages
+            )
+            if not covered:
+                self.misses += 1
+                return None
+
+            places = []
+            for cell in self._cells_overlapping(lat, lng, radius_m):
+                for place in index.cells.get(cell, dict()).values():
+                    if now - place["_indexed_at"] >= self.coverage_ttl_s:
+                        continue
+                    place_location = place["geometry"]["location"]
+                    distance_m = haversine_m(
+                        lat, lng, place_location["lat"], place_location["lng"]
+                    )
+                    if distance_m <= radius_m:
+                        places.append(
+                            {k: v for k, v in place.items() if k != "_indexed_at"}
+                        )
+
+            self.hits += 1
+            return places
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "keywords": len(self._keywords),
+                "coverages": sum(len(i.coverages) for i in self._keywords.values()),
+                "searches": sum(len(i.searches) for i in self._keywords.values()),
+                "places": sum(
+                    len(cell)
+                    for i in self._keywords.values()
+                    for cell in i.cells.values()
+                ),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
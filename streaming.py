@@ -0,0 +1,113 @@
+"""
+Accumulates streamed model output in linear time.
+
+Chunks are appended as they arrive and stop sequences are matched against the new chunk plus a short tail
+held back from the previous chunks, so no work depends on how much text has already been streamed. The full
+string is only joined when `text` is read, i.e. when an update is actually sent to the UI.
+"""
+from typing import Any, AsyncIterator, Iterable, List
+
+import asyncio
+
+
+class StreamingTextBuffer:
+    def __init__(
+        self, stop_sequences: Iterable[str] = (), lstrip: bool = False
+    ) -> None:
+        self.stop_sequences = [s for s in stop_sequences if s]
+        self.lstrip = lstrip
+        self.stopped = False
+
+        self._chunks: List[str] = []
+        self._text = ""
+        # Text that could still turn out to be the beginning of a stop sequence
+        self._pending = ""
+
+    def append(self, chunk: str) -> None:
+        if self.stopped or not chunk:
+            return
+
+        window = self._pending + chunk
+        if self.lstrip and not self._text and not self._chunks:
+            window = window.lstrip()
+
+        stop_index = min(
+            (i for i in (window.find(s) for s in self.stop_sequences) if i != -1),
+            default=-1,
+        )
+        if stop_index != -1:
+            self.stopped = True
+            self._pending = ""
+            self._commit(window[:stop_index])
+            return
+
+        num_held_back = self._get_num_held_back(window)
+        self._pending = window[len(window) - num_held_back :]
+        self._commit(window[: len(window) - num_held_back])
+
+    def finish(self) -> None:
+        """
+        Called once the stream ends, releases any text held back as a possible stop sequence prefix.
+        """
+        self._commit(self._pending)
+        self._pending = ""
+
+    def _get_num_held_back(self, window: str) -> int:
+        # Longest suffix of the window that is a proper prefix of some stop sequence
+        num_held_back = 0
+        for stop_sequence in self.stop_sequences:
+            for size in range(min(len(stop_sequence) - 1, len(window)), 0, -1):
+                if window.endswith(stop_sequence[:size]):
+                    num_held_back = max(num_held_back, size)
+                    break
+        return num_held_back
+
+    def _commit(self, text: str) -> None:
+        if text:
+            self._chunks.append(text)
+
+    @property
+    def text(self) -> str:
+        if self._chunks:
+            self._text = "".join([self._text, *self._chunks])
+            self._chunks = []
+        return self._text
+
+
+async def merge_updates(*iterators: AsyncIterator[Any]) -> AsyncIterator[None]:
+    """
+    Consumes all of `iterators` concurrently, where each item only signals that some shared state changed, and
+    yields once per wake-up no matter how many items arrived in the meantime. A slow consumer therefore sees
+    the latest state instead of falling behind on every intermediate one. The first exception raised by any of
+    them is re-raised here, and closing the merged iterator cancels the rest.
+    """
+    changed = asyncio.Event()
+    errors: List[Exception] = []
+    updated = False
+    num_running = len(iterators)
+
+    async def drain(iterator: AsyncIterator[Any]) -> None:
+        nonlocal updated, num_running
+        try:
+            async for _ in iterator:
+                updated = True
+                changed.set()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            num_running -= 1
+            changed.set()
+
+    tasks = [asyncio.create_task(drain(iterator)) for iterator in iterators]
+    try:
+        while num_running:
+            await changed.wait()
+            changed.clear()
+            if errors:
+                raise errors[0]
+            if updated:
+                updated = False
+                yield
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -5,25 +5,158 @@ Nothing in this file is specific to Raven, code/information related to Raven can
 
 For more information about the Google Maps Places API Python client, see https://github.com/googlemaps/google-maps-services-python
 """
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Tuple
+
+from functools import wraps
 
 from math import radians, cos, sin, asin, sqrt
 
-import random
+import asyncio
+
+import copy
+
+import json
+
+import time
 
-import requests
+import httpx
 
-from googlemaps import Client
+from googlemaps.exceptions import ApiError
 
 from config import DemoConfig
+from gazetteer import Gazetteer
+from http_client import AsyncHTTPClient
+from place_cache import PlaceCache
+from places_scheduler import EndpointBudget, PlacesScheduler, Priority
+from request_logging import get_logger, log_event
+from resilience import (
+    DEFAULT_ENDPOINT_POLICIES,
+    EndpointUnavailableError,
+    ResilienceLayer,
+)
+from review_selection import select_reviews
+from spatial_index import SpatialPlaceIndex
+
+
+logger = get_logger("tools")
+
+IP_API_URL = "https://pro.ip-api.com/json/{client_ip}"
+PLACES_API_BASE_URL = "https://maps.googleapis.com/maps/api/place"
+# Web service paths for each `googlemaps.Client` Places method we use
+PLACES_API_PATHS = {
+    "find_place": "findplacefromtext",
+    "place": "details",
+    "places": "textsearch",
+    "places_nearby": "nearbysearch",
+}
+# Shared across every session in this process, keep these comfortably under the project's Places quota
+PLACES_ENDPOINT_BUDGETS = {
+    "find_place": EndpointBudget(queries_per_second=10, burst=20),
+    "place": EndpointBudget(queries_per_second=10, burst=20),
+    "places": EndpointBudget(queries_per_second=5, burst=10),
+    "places_nearby": EndpointBudget(queries_per_second=5, burst=10),
+}
+PLACES_MAX_WAIT_S = {
+    Priority.INTERACTIVE: 5.0,
+    Priority.BATCH: 60.0,
+}
+# How long a successful response from each endpoint may be served from the place cache
+PLACES_CACHE_TTL_S = {
+    "find_place": 7 * 24 * 60 * 60,
+    "place": 24 * 60 * 60,
+    "places": 60 * 60,
+    "places_nearby": 60 * 60,
+}
+# Nearby searches return at most this many places per page
+PLACES_PAGE_SIZE = 20
+# ZERO_RESULTS responses are often one-off misses, so they are only cached long enough to absorb retries
+PLACES_NEGATIVE_CACHE_TTL_S = 5 * 60
+# Client locations are looked up once and shared by every request from that client for this long
+LOCATION_INFORMATION_TTL_S = 10 * 60
+LOCATION_INFORMATION_CACHE_SIZE = 10000
+DEFAULT_LOCATION_INFORMATION = {
+    "lat": "37.7577607",
+    "lon": "-122.4788854",
+    "city": "San Francisco",
+    "regionName": "California",
+    "countryCode": "US",
+    "country": "United States",
+    "region": "CA",
+}
+
+
+def prompt_definition(f: Callable) -> Callable:
+    """
+    Marks a tool method as only the signature and docstring Raven is prompted with. The tool itself is
+    implemented once, by the async method of the same name prefixed with `a`.
+    """
+
+    @wraps(f)
+    def wrapper(self, *args, **kwargs):
+        raise NotImplementedError(
+            f"`{f.__name__}` is a prompt definition, await `a{f.__name__}` instead"
+        )
+
+    return wrapper
 
 
 class Tools:
     def __init__(self, config: DemoConfig) -> None:
         self.config = config
 
-        self.gmaps = Client(config.gmaps_client_key)
+        # Shared with the inference clients in `RavenDemo`, see `resilience.py`
+        self.resilience = ResilienceLayer(DEFAULT_ENDPOINT_POLICIES)
+        self.http = AsyncHTTPClient()
+        self.places_scheduler = PlacesScheduler(
+            PLACES_ENDPOINT_BUDGETS, PLACES_MAX_WAIT_S
+        )
+        self.place_cache = (
+            PlaceCache(config.place_cache_path, config.place_cache_max_bytes)
+            if config.place_cache_path
+            else None
+        )
+        self.gazetteer = (
+            Gazetteer(config.gazetteer_path) if config.gazetteer_path else None
+        )
+        self.spatial_index = SpatialPlaceIndex(
+            coverage_ttl_s=PLACES_CACHE_TTL_S["places_nearby"]
+        )
         self.client_ip: str | None = None
+        self.priority = Priority.INTERACTIVE
+
+        # Both map keys to in-flight or finished lookups, so concurrent callers share a single request
+        self._location_information_tasks: Dict[
+            str | None, Tuple[float, asyncio.Task]
+        ] = dict()
+        self._resolved_location_tasks: Dict[str, asyncio.Task] = dict()
+
+    def for_request(
+        self, client_ip: str | None, priority: Priority = Priority.INTERACTIVE
+    ) -> "Tools":
+        """
+        Returns a shallow copy of these tools bound to a single request. The Places client, HTTP pool, scheduler
+        and any caches are shared, so this is cheap enough to do once per request.
+
+        Batch or replay traffic should pass `Priority.BATCH` so interactive sessions are scheduled first.
+        """
+        tools = copy.copy(self)
+        tools.client_ip = client_ip
+        tools.priority = priority
+        tools._resolved_location_tasks = dict()
+        return tools
+
+    def prefetch_current_location(self) -> None:
+        """
+        Starts looking up the client's location in the background, so the tools find it already resolved.
+        """
+        self._get_current_location_information_task()
+
+    def prefetch_latitude_longitude(self, location: str) -> None:
+        """
+        Starts resolving `location` in the background. The result is reused by every later
+        `aget_latitude_longitude` call for the same location on these tools.
+        """
+        self._get_resolved_location_task(location)
 
     def haversine(self, lon1, lat1, lon2, lat2) -> float:
         """
@@ -40,42 +173,175 @@ class Tools:
         r = 6371  # Radius of Earth in kilometers. Use 3956 for miles
         return round(c * r, 2)
 
+    @prompt_definition
     def get_current_location(self) -> str:
         """
         Returns the current location. ONLY use this if the user has not provided an explicit location in the query.
         """
-        location_data = self._get_current_location_information()
+
+    async def aget_current_location(self) -> str:
+        location_data = await self._aget_current_location_information()
+        return self._format_current_location(location_data)
+
+    def get_default_location(self) -> str:
+        """
+        The location used when a client cannot be located.
+        """
+        return self._format_current_location(DEFAULT_LOCATION_INFORMATION)
+
+    def _format_current_location(self, location_data: Dict[str, Any]) -> str:
         city = location_data["city"]
         region = location_data["regionName"]
         country = location_data["countryCode"]
         location = f"{city}, {region}, {country}"
         return location
 
-    def _get_current_location_information(self) -> Dict[str, Any] | None:
-        default_response = {
-            "lat": "37.7577607",
-            "lon": "-122.4788854",
-            "city": "San Francisco",
-            "regionName": "California",
-            "countryCode": "US",
-            "country": "United States",
-            "region": "CA",
-        }
-        response = requests.get(
-            f"https://pro.ip-api.com/json/{self.client_ip}?key={self.config.ip_api_key}"
+    async def _aget_current_location_information(self) -> Dict[str, Any] | None:
+        try:
+            # Shielded so that a caller giving up does not cancel the lookup for everyone else
+            return await asyncio.shield(self._get_current_location_information_task())
+        except (EndpointUnavailableError, httpx.HTTPError):
+            # Not cached, the failed task is replaced by the next lookup
+            return self._parse_location_response(None)
+
+    def _get_current_location_information_task(self) -> asyncio.Task:
+        now = time.monotonic()
+        expires_at, task = self._location_information_tasks.get(
+            self.client_ip, (0, None)
         )
-        if not response.ok:
-            print(f"Not able to find user. Defaulting to {default_response}")
-            return default_response
-
-        response = response.json()
-        if response["status"] != "success":
-            print(f"Not able to find user. Defaulting to {default_response}")
-            return default_response
+        if task is None or expires_at < now or self._has_failed(task):
+            # Re-inserted at the end, so the dict stays ordered from oldest to newest lookup
+            self._location_information_tasks.pop(self.client_ip, None)
+            self._evict_location_information(now)
+            task = self._create_background_task(
+                self._afetch_current_location_information()
+            )
+            self._location_information_tasks[self.client_ip] = (
+                now + LOCATION_INFORMATION_TTL_S,
+                task,
+            )
+        return task
+
+    def _evict_location_information(self, now: float) -> None:
+        # Mutated in place, the dict is shared with every copy made by `for_request`
+        tasks = self._location_information_tasks
+        if len(tasks) < LOCATION_INFORMATION_CACHE_SIZE:
+            return
+
+        for client_ip in [
+            ip for ip, (expires_at, _) in tasks.items() if expires_at < now
+        ]:
+            del tasks[client_ip]
+        # Still full of fresh lookups, make room by dropping the oldest ones
+        num_evicted = len(tasks) - LOCATION_INFORMATION_CACHE_SIZE + 1
+        for client_ip in list(tasks)[: max(num_evicted, 0)]:
+            del tasks[client_ip]
+
+    async def _afetch_current_location_information(self) -> Dict[str, Any]:
+        response = await self.resilience.call(
+            "ip_api",
+            lambda: self.http.get(
+                IP_API_URL.format(client_ip=self.client_ip),
+                params={"key": self.config.ip_api_key},
+            ),
+        )
+        if not response.is_success:
+            return self._parse_location_response(None)
+
+        return self._parse_location_response(response.json())
+
+    def _parse_location_response(
+        self, response: Dict[str, Any] | None
+    ) -> Dict[str, Any]:
+        default_response = DEFAULT_LOCATION_INFORMATION
+        if response is None or response["status"] != "success":
+            log_event(
+                logger,
+                "client_location_defaulted",
+                city=default_response["city"],
+            )
+            return dict(default_response)
 
-        print(f"User successfully located in {response}")
+        log_event(
+            logger,
+            "client_located",
+            city=response.get("city"),
+            country_code=response.get("countryCode"),
+        )
         return response
 
+    async def _aplaces_request(
+        self, endpoint: str, cache_key: List, **params
+    ) -> Dict[str, Any]:
+        """
+        Calls the Places web service `endpoint` once the scheduler has budget for it, unless the place cache
+        already has a response for `cache_key`. Mirrors the `googlemaps.Client` behavior of raising `ApiError`
+        for any status other than OK or ZERO_RESULTS.
+        """
+        return (
+            await self._aplaces_request_with_fetched_at(endpoint, cache_key, **params)
+        )[0]
+
+    async def _aplaces_request_with_fetched_at(
+        self, endpoint: str, cache_key: List, **params
+    ) -> Tuple[Dict[str, Any], float]:
+        """
+        Like `_aplaces_request`, but also returns when the response was fetched from Google.
+        """
+        if self.place_cache is not None:
+            key = json.dumps(cache_key)
+            entry = await self.place_cache.aget_entry(endpoint, key)
+            if entry is not None:
+                return self._get_cached_places_response(endpoint, *entry)
+
+        response = await self._afetch_places(endpoint, **params)
+
+        if self.place_cache is not None:
+            await self.place_cache.aset(
+                endpoint, key, response, self._get_places_cache_ttl(endpoint, response)
+            )
+        return response, time.time()
+
+    def _get_cached_places_response(
+        self, endpoint: str, response: Dict[str, Any], expires_at: float
+    ) -> Tuple[Dict[str, Any], float]:
+        # The TTL only depends on the endpoint and the response, so it tells us when the entry was written
+        return response, expires_at - self._get_places_cache_ttl(endpoint, response)
+
+    def _get_places_cache_ttl(self, endpoint: str, response: Dict[str, Any]) -> float:
+        if response.get("status") == "ZERO_RESULTS":
+            return min(PLACES_NEGATIVE_CACHE_TTL_S, PLACES_CACHE_TTL_S[endpoint])
+        return PLACES_CACHE_TTL_S[endpoint]
+
+    async def _afetch_places(self, endpoint: str, **params) -> Dict[str, Any]:
+        await self.places_scheduler.aacquire(endpoint, self.priority)
+
+        params = {k: v for k, v in params.items() if v is not None}
+        params["key"] = self.config.gmaps_client_key
+
+        async def fetch() -> Dict[str, Any]:
+            response = await self.http.get_json(
+                f"{PLACES_API_BASE_URL}/{PLACES_API_PATHS[endpoint]}/json",
+                params=params,
+            )
+            if response["status"] not in ("OK", "ZERO_RESULTS"):
+                raise ApiError(response["status"], response.get("error_message"))
+            return response
+
+        return await self.resilience.call("places", fetch, self._is_places_failure)
+
+    def _is_places_failure(self, error: Exception) -> bool:
+        # Statuses such as INVALID_REQUEST come from bad arguments, not from an unhealthy Places API
+        return not isinstance(error, ApiError) or error.status in (
+            "OVER_QUERY_LIMIT",
+            "UNKNOWN_ERROR",
+        )
+
+    def _latlng_to_str(self, latlong: Dict[str, float] | tuple) -> str:
+        if isinstance(latlong, dict):
+            return f"{latlong['lat']},{latlong['lng']}"
+        return f"{latlong[0]},{latlong[1]}"
+
     def sort_results(
         self, places: list, sort: str, descending: bool = True, first_n: int = None
     ) -> List:
@@ -108,30 +374,50 @@ class Tools:
             items = items[:first_n]
         return items
 
+    async def asort_results(
+        self, places: list, sort: str, descending: bool = True, first_n: int = None
+    ) -> List:
+        return self.sort_results(places, sort, descending=descending, first_n=first_n)
+
+    @prompt_definition
     def get_latitude_longitude(self, location: str) -> List:
         """
         Given a city name, this function provides the latitude and longitude of the specific location.
 
         - location: This can be a city like 'Austin', or a place like 'Austin Airport', etc.
         """
-        if (
-            isinstance(location, list)
-            and len(location) != 0
-            and isinstance(location[0], dict)
-        ):
-            return location
 
-        current_loc_info = self._get_current_location_information()
-        lat = current_loc_info["lat"]
-        lng = current_loc_info["lon"]
+    async def aget_latitude_longitude(self, location: str) -> List:
+        if self._is_resolved_location(location):
+            return location
+        if not isinstance(location, str):
+            return await self._aresolve_location(location)
+
+        task = self._get_resolved_location_task(location)
+        # Every caller gets its own copy, since some tools annotate the place details they are given
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _get_resolved_location_task(self, location: str) -> asyncio.Task:
+        task = self._resolved_location_tasks.get(location)
+        if task is None or self._has_failed(task):
+            task = self._create_background_task(self._aresolve_location(location))
+            self._resolved_location_tasks[location] = task
+        return task
+
+    async def _aresolve_location(self, location: str) -> List:
+        current_loc_info = await self._aget_current_location_information()
+        gazetteer_result = self._lookup_gazetteer(location, current_loc_info)
+        if gazetteer_result is not None:
+            return [gazetteer_result]
 
-        radius_miles = 100  # Not a hyperparameter
-        radius_meters = radius_miles * 1609.34
         # For response content, see https://developers.google.com/maps/documentation/places/web-service/search-find-place#find-place-responses
-        results = self.gmaps.find_place(
-            location,
-            input_type="textquery",
-            location_bias=f"circle:{radius_meters}@{lat},{lng}",
+        location_bias = self._get_location_bias(current_loc_info)
+        results = await self._aplaces_request(
+            "find_place",
+            [location, location_bias],
+            input=location,
+            inputtype="textquery",
+            locationbias=location_bias,
         )
         if results["status"] != "OK":
             return []
@@ -140,9 +426,48 @@ class Tools:
         place_id = results["candidates"][0]["place_id"]
 
         # For response format, see https://developers.google.com/maps/documentation/places/web-service/details#PlaceDetailsResponses
-        place_details = self.gmaps.place(place_id=place_id)["result"]
+        place_details = (
+            await self._aplaces_request("place", [place_id], place_id=place_id)
+        )["result"]
         return [place_details]
 
+    def _create_background_task(self, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        # Mark failures as retrieved, a prefetch nobody ends up waiting on should not be reported as an error
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    def _has_failed(self, task: asyncio.Task) -> bool:
+        return task.done() and (task.cancelled() or task.exception() is not None)
+
+    def _is_resolved_location(self, location: Any) -> bool:
+        return (
+            isinstance(location, list)
+            and len(location) != 0
+            and isinstance(location[0], dict)
+        )
+
+    def _lookup_gazetteer(
+        self, location: str, current_loc_info: Dict[str, Any]
+    ) -> Dict[str, Any] | None:
+        if self.gazetteer is None or not isinstance(location, str):
+            return None
+        return self.gazetteer.lookup(
+            location,
+            bias_lat=float(current_loc_info["lat"]),
+            bias_lng=float(current_loc_info["lon"]),
+        )
+
+    def _get_location_bias(self, current_loc_info: Dict[str, Any]) -> str:
+        # Rounded to ~1km so that nearby users share place cache entries
+        lat = round(float(current_loc_info["lat"]), 2)
+        lng = round(float(current_loc_info["lon"]), 2)
+
+        radius_miles = 100  # Not a hyperparameter
+        radius_meters = radius_miles * 1609.34
+        return f"circle:{radius_meters}@{lat},{lng}"
+
+    @prompt_definition
     def get_distance(self, place_1: str, place_2: str):
         """
         Provides distance between two locations. Do NOT provide latitude longitude, but rather, provide the string descriptions.
@@ -152,24 +477,32 @@ class Tools:
         - place_1: The first location.
         - place_2: The second location.
         """
-        if isinstance(place_1, list) and len(place_1) > 0:
-            place_1 = place_1[0]
-        if isinstance(place_2, list) and len(place_2) > 0:
-            place_2 = place_2[0]
 
-        if isinstance(place_1, dict):
-            place_1: str = place_1["name"]
-        if isinstance(place_2, dict):
-            place_2: str = place_2["name"]
+    async def aget_distance(self, place_1: str, place_2: str):
+        place_1 = self._get_distance_place_name(place_1)
+        place_2 = self._get_distance_place_name(place_2)
 
-        latlong_1 = self.get_latitude_longitude(place_1)
+        latlong_1, latlong_2 = await asyncio.gather(
+            self.aget_latitude_longitude(place_1),
+            self.aget_latitude_longitude(place_2),
+        )
         if len(latlong_1) == 0:
             return f"No place found for `{place_1}`. Please be more explicit."
-
-        latlong_2 = self.get_latitude_longitude(place_2)
         if len(latlong_2) == 0:
             return f"No place found for `{place_2}`. Please be more explicit."
 
+        return self._get_distance_result(place_1, place_2, latlong_1, latlong_2)
+
+    def _get_distance_place_name(self, place: Any) -> Any:
+        if isinstance(place, list) and len(place) > 0:
+            place = place[0]
+        if isinstance(place, dict):
+            place: str = place["name"]
+        return place
+
+    def _get_distance_result(
+        self, place_1: str, place_2: str, latlong_1: List, latlong_2: List
+    ) -> List:
         latlong_1 = latlong_1[0]
         latlong_2 = latlong_2[0]
 
@@ -190,6 +523,7 @@ class Tools:
             f"The distance between {place_1} and {place_2} is {dist:.3f} miles",
         ]
 
+    @prompt_definition
     def get_recommendations(self, topics: list, lat_long: tuple):
         """
         Returns the recommendations for a specific topic that is of interest. Remember, a topic IS NOT an establishment. For establishments, please use another function.
@@ -197,18 +531,21 @@ class Tools:
         - topics (list): A list of topics of interest to pull recommendations for. Can be multiple words.
         - lat_long (tuple): The lat_long of interest.
         """
+
+    async def aget_recommendations(self, topics: list, lat_long: tuple):
         if len(lat_long) == 0:
             return []
 
         topic = " ".join(topics)
         latlong = lat_long[0]["geometry"]["location"]
+        latlong = self._latlng_to_str(latlong)
         # For response format, see https://developers.google.com/maps/documentation/places/web-service/search-find-place#find-place-responses
-        results = self.gmaps.places(
-            query=topic,
-            location=latlong,
+        results = await self._aplaces_request(
+            "places", [topic, latlong], query=topic, location=latlong
         )
         return results["results"]
 
+    @prompt_definition
     def find_places_near_location(
         self, type_of_place: list, location: str, radius_miles: int = 50
     ) -> List[Dict]:
@@ -219,24 +556,82 @@ class Tools:
         - location (str): The location for the search. This can be a city's name, region, or anything that specifies the location.
         - radius_miles (int): Optional. The max distance from the described location to limit the search. Distance is specified in miles.
         """
-        place_details = self.get_latitude_longitude(location)
+
+    async def afind_places_near_location(
+        self, type_of_place: list, location: str, radius_miles: int = 50
+    ) -> List[Dict]:
+        place_details = await self.aget_latitude_longitude(location)
         if len(place_details) == 0:
             return []
         place_details = place_details[0]
-        location = place_details["name"]
         latlong = place_details["geometry"]["location"]
 
         type_of_place = " ".join(type_of_place)
-        # Perform the search using Google Places API
-        # For response format, see https://developers.google.com/maps/documentation/places/web-service/search-nearby#nearby-search-responses
-        places_nearby = self.gmaps.places_nearby(
-            location=(latlong["lat"], latlong["lng"]),
-            keyword=type_of_place,
-            radius=radius_miles * 1609.34,
+        radius_meters = radius_miles * 1609.34
+        places_nearby = self._query_spatial_index(type_of_place, latlong, radius_meters)
+        if places_nearby is None:
+            # Perform the search using Google Places API
+            # For response format, see https://developers.google.com/maps/documentation/places/web-service/search-nearby#nearby-search-responses
+            places_nearby, fetched_at = await self._aplaces_request_with_fetched_at(
+                "places_nearby",
+                [self._latlng_to_str(latlong), type_of_place, radius_miles],
+                location=self._latlng_to_str(latlong),
+                keyword=type_of_place,
+                radius=radius_meters,
+            )
+            self._add_to_spatial_index(
+                type_of_place, latlong, radius_meters, places_nearby, fetched_at
+            )
+        return self._get_places_near_location(place_details, places_nearby)
+
+    def _query_spatial_index(
+        self, type_of_place: str, latlong: Dict[str, float], radius_meters: float
+    ) -> Dict[str, Any] | None:
+        """
+        Serves a nearby search from places we have already fetched, in the same shape as the Places response.
+        Returns None when the index has no fresh coverage for the search.
+        """
+        places = self.spatial_index.query(
+            type_of_place, latlong["lat"], latlong["lng"], radius_meters
+        )
+        if places is None:
+            return None
+        return {"status": "OK" if places else "ZERO_RESULTS", "results": places}
+
+    def _add_to_spatial_index(
+        self,
+        type_of_place: str,
+        latlong: Dict[str, float],
+        radius_meters: float,
+        places_nearby: Dict[str, Any],
+        fetched_at: float,
+    ) -> None:
+        if places_nearby["status"] not in ("OK", "ZERO_RESULTS"):
+            return
+        # Google only returns the most prominent page of places, a full page says nothing about the rest
+        complete = (
+            len(places_nearby["results"]) < PLACES_PAGE_SIZE
+            and "next_page_token" not in places_nearby
         )
+        self.spatial_index.add(
+            type_of_place,
+            latlong["lat"],
+            latlong["lng"],
+            radius_meters,
+            places_nearby["results"],
+            complete=complete,
+            fetched_at=fetched_at,
+        )
+
+    def _get_places_near_location(
+        self, place_details: Dict[str, Any], places_nearby: Dict[str, Any]
+    ) -> List[Dict]:
         if places_nearby["status"] != "OK":
             return []
 
+        location = place_details["name"]
+        latlong = place_details["geometry"]["location"]
+
         places_nearby = places_nearby["results"]
         places = []
         for place_nearby in places_nearby:
@@ -259,6 +654,7 @@ class Tools:
 
         return self.sort_results(places, sort="distance", descending=False)
 
+    @prompt_definition
     def get_some_reviews(self, place_names: list, location: str = None):
         """
         Given an establishment (or place) name, return reviews about the establishment.
@@ -266,7 +662,19 @@ class Tools:
         - place_names (list): The name of the establishment. This should be a physical location name. You can provide multiple inputs.
         - location (str) : The location where the restaurant is located. Optional argument.
         """
-        all_reviews = []
+
+    async def aget_some_reviews(self, place_names: list, location: str = None):
+        review_place_names = self._get_review_place_names(place_names, location)
+        all_place_details = await asyncio.gather(
+            *(
+                self.aget_latitude_longitude(place_name)
+                for place_name in review_place_names
+            )
+        )
+        return self._get_reviews(review_place_names, all_place_details)
+
+    def _get_review_place_names(self, place_names: list, location: str = None) -> List:
+        review_place_names = []
         for place_name in place_names:
             if isinstance(place_name, str):
                 if location and isinstance(location, list) and len(location) > 0:
@@ -290,19 +698,16 @@ class Tools:
             elif isinstance(place_name, dict) and "name" in place_name:
                 place_name = place_name["name"]
 
-            place_details = self.get_latitude_longitude(place_name)
-            if len(place_details) == 0:
-                continue
-            place_details = place_details[0]
-
-            reviews = place_details.get("reviews", [])
-
-            for review in reviews:
-                review["for_location"] = place_name
-                review["formatted_address"] = place_details["formatted_address"]
+            review_place_names.append(place_name)
 
-            all_reviews.extend(reviews)
+        return review_place_names
 
-        random.shuffle(all_reviews)
-
-        return all_reviews
+    def _get_reviews(
+        self, review_place_names: List, all_place_details: List[List]
+    ) -> List[Dict]:
+        places = [
+            (place_name, place_details[0])
+            for place_name, place_details in zip(review_place_names, all_place_details)
+            if len(place_details) > 0
+        ]
+        return select_reviews(places)